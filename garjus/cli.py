@@ -283,6 +283,22 @@ def tasks():
     pprint.pprint(g.tasks())
 
 
+@cli.command('jobstats')
+@click.option('--project', '-p', 'project', multiple=True)
+@click.option('--days', '-d', 'days', type=int, default=30)
+@click.option('--csv', '-c', 'csv', required=False)
+def jobstats(project, days, csv):
+    click.echo('garjus! jobstats')
+    import pandas as pd
+    pd.set_option('display.max_rows', None)
+    pd.set_option('display.max_columns', None)
+    stats = Garjus().job_stats(projects=project, days=days)
+    if csv:
+        stats.to_csv(csv, index=False)
+    else:
+        pprint.pprint(stats)
+
+
 @cli.command('update')
 @click.argument(
     'choice',
@@ -355,6 +371,21 @@ def stats(projects, proctypes, sesstypes, csv, persubject, analysis, sessions):
         sessions)
 
 
+@cli.command('syncstats')
+@click.option('--projects', '-p', 'projects', required=True)
+@click.option('--full', is_flag=True, help='Export all assessors again')
+def syncstats(projects, full):
+    """Sync local stats archive from REDCap.
+
+    Only assessors with stats added or removed are exported, values edited
+    in place in REDCap are only synced with --full.
+    """
+    click.echo('garjus! syncstats')
+    g = Garjus()
+    for p in projects.split(','):
+        pprint.pprint({p: g.sync_stats_archive(p, full=full)})
+
+
 @cli.command('export')
 @click.option('--projects', '-p', 'projects', required=True)
 @click.option('--types', '-t', 'proctypes', required=False)
@@ -487,10 +518,15 @@ def image03csv(project, startdate, enddate, site):
 @cli.command('retry')
 @click.option('--project', '-p', 'project', required=True)
 @click.option('--type', '-t', 'proctype', required=False)
-def retry(project, proctype=None):
+@click.option('--dry-run', 'dry_run', is_flag=True)
+def retry(project, proctype=None, dry_run=False):
     click.echo('garjus! retry')
     g = Garjus()
-    g.retry(project, proctype)
+    plan = g.retry(project, proctype, dry_run=dry_run)
+    if dry_run:
+        import pandas as pd
+        pd.set_option('display.max_rows', None)
+        pprint.pprint(plan)
 
 
 @cli.command('image03download')
@@ -5,6 +5,8 @@ import dash
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import load_figure_template
 
+from . import metrics
+
 
 dbc_css = "https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css"
 
@@ -32,6 +34,8 @@ app = dash.Dash(
 
 server = app.server
 
+metrics.instrument(server)
+
 #app.config.suppress_callback_exceptions = True
 
 # more here:
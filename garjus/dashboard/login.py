@@ -18,7 +18,9 @@ from .pages import stats
 from .pages import analyses
 from .pages import processors
 from .pages import reports
+from .pages import pool
 from . import content
+from . import metrics
 
 # This file serves the same purpose as index.py but wrapped in a flask app
 # with user/password authentication. garjus will return this app when
@@ -79,6 +81,9 @@ def login(message=""):
                     logger.debug('Garjus login')
                     Garjus.login(hostname, username, password)
 
+                    # Connect again with the new token
+                    pool.discard(username)
+
                     login_user(User(username, hostname))
 
                     # What page do we send?
@@ -116,6 +121,7 @@ def login(message=""):
 def logout():
     if current_user:
         if current_user.is_authenticated:
+            pool.discard(current_user.id)
             logout_user()
     return render_template('login.html', message="you have been logged out")
 
@@ -145,6 +151,9 @@ app.title = 'dashboard'
 
 server.config.update(SECRET_KEY=os.urandom(24))
 
+# Added after check_login so the metrics require login
+metrics.instrument(server)
+
 # Login manager object will be used to login / logout users
 login_manager = LoginManager()
 login_manager.init_app(server)
@@ -0,0 +1,282 @@
+"""Dashboard performance metrics, recorded in this process.
+
+Records time and response size of each Dash callback, cache hits and
+misses, and requests made to REDCap and XNAT. Metrics are shown at
+/admin/perf and, when GARJUS_PROMETHEUS is set, exported as Prometheus
+text at /metrics. Counts start from zero when the process starts.
+
+Both are only for admins: logged in users named in GARJUS_ADMINS when
+the server has a login, otherwise requests from the local host.
+"""
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import pandas as pd
+from flask import g, request, render_template, Response, abort, current_app
+from flask_login import current_user
+
+
+logger = logging.getLogger('garjus.dashboard.metrics')
+
+
+CALLBACK_PATH = '/_dash-update-component'
+
+PROMETHEUS_ENV = 'GARJUS_PROMETHEUS'
+
+# Comma separated usernames allowed to see metrics when logging in
+ADMINS_ENV = 'GARJUS_ADMINS'
+DEFAULT_ADMINS = 'admin'
+
+LOCAL_ADDRS = ['127.0.0.1', '::1']
+
+_lock = threading.Lock()
+
+# callback name -> counts
+_callbacks = {}
+
+# (cache name, 'hit' or 'miss') -> count
+_caches = {}
+
+# service -> counts
+_upstream = {}
+
+
+def _callback_name(output):
+    # Dash joins multiple outputs with dots, e.g. ..a.data...b.columns..
+    return ','.join(x for x in output.strip('.').split('...') if x)
+
+
+def record_callback(name, secs, nbytes=0, error=False):
+    with _lock:
+        c = _callbacks.setdefault(name, {
+            'calls': 0, 'errors': 0, 'secs': 0.0, 'max_secs': 0.0, 'bytes': 0})
+        c['calls'] += 1
+        c['errors'] += int(error)
+        c['secs'] += secs
+        c['max_secs'] = max(c['max_secs'], secs)
+        c['bytes'] += nbytes
+
+
+def count_cache(name, hit):
+    """Count a hit or miss of a named cache."""
+    key = (name, 'hit' if hit else 'miss')
+    with _lock:
+        _caches[key] = _caches.get(key, 0) + 1
+
+
+def count_upstream(service, secs, error=False):
+    with _lock:
+        u = _upstream.setdefault(service, {'requests': 0, 'errors': 0, 'secs': 0.0})
+        u['requests'] += 1
+        u['errors'] += int(error)
+        u['secs'] += secs
+
+
+def _response_hook(service):
+    # requests response hook counting calls to service
+    def _hook(response, *args, **kwargs):
+        count_upstream(
+            service or urlparse(response.url).netloc,
+            response.elapsed.total_seconds(),
+            error=response.status_code >= 400)
+
+    return _hook
+
+
+def instrument_session(session, service):
+    """Count requests made with a requests session."""
+    if session is None:
+        return
+
+    hooks = session.hooks.setdefault('response', [])
+    if not any(getattr(x, 'service', None) == service for x in hooks):
+        hook = _response_hook(service)
+        hook.service = service
+        hooks.append(hook)
+
+
+def instrument_garjus(garjus):
+    """Count requests made to XNAT by a Garjus connection."""
+    try:
+        instrument_session(getattr(garjus.xnat(), '_http', None), 'xnat')
+    except Exception as err:
+        logger.debug(f'cannot count xnat requests:{err}')
+
+
+def _instrument_redcap():
+    # PyCap sends all requests with one module level session
+    try:
+        from redcap import request as redcap_request
+        instrument_session(getattr(redcap_request, '_session', None), 'redcap')
+    except Exception as err:
+        logger.debug(f'cannot count redcap requests:{err}')
+
+
+def callback_table():
+    with _lock:
+        rows = [dict(CALLBACK=k, **v) for k, v in _callbacks.items()]
+
+    df = pd.DataFrame(rows, columns=[
+        'CALLBACK', 'calls', 'errors', 'secs', 'max_secs', 'bytes'])
+
+    df['MEAN_MS'] = (1000 * df.secs / df.calls).round(1)
+    df['MAX_MS'] = (1000 * df.max_secs).round(1)
+    df['MEAN_KB'] = (df.bytes / df.calls / 1024).round(1)
+    df['TOTAL_KB'] = (df.bytes / 1024).round(1)
+    df = df.rename(columns={'calls': 'CALLS', 'errors': 'ERRORS'})
+
+    return df[[
+        'CALLBACK', 'CALLS', 'ERRORS', 'MEAN_MS', 'MAX_MS', 'MEAN_KB',
+        'TOTAL_KB']].sort_values('MEAN_MS', ascending=False)
+
+
+def cache_table():
+    with _lock:
+        caches = dict(_caches)
+
+    names = sorted(set(k[0] for k in caches))
+    df = pd.DataFrame({
+        'CACHE': names,
+        'HITS': [caches.get((x, 'hit'), 0) for x in names],
+        'MISSES': [caches.get((x, 'miss'), 0) for x in names],
+    })
+    df['HIT_RATE'] = (df.HITS / (df.HITS + df.MISSES)).round(2)
+
+    return df
+
+
+def upstream_table():
+    with _lock:
+        rows = [dict(SERVICE=k, **v) for k, v in _upstream.items()]
+
+    df = pd.DataFrame(rows, columns=['SERVICE', 'requests', 'errors', 'secs'])
+    df['MEAN_MS'] = (1000 * df.secs / df.requests).round(1)
+    df['TOTAL_SECS'] = df.secs.round(1)
+    df = df.rename(columns={'requests': 'REQUESTS', 'errors': 'ERRORS'})
+
+    return df[['SERVICE', 'REQUESTS', 'ERRORS', 'MEAN_MS', 'TOTAL_SECS']]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text format."""
+    lines = []
+
+    def _metric(name, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in samples:
+            labels = ','.join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            lines.append(f'{name}{{{labels}}} {value}')
+
+    with _lock:
+        callbacks = {k: dict(v) for k, v in _callbacks.items()}
+        caches = dict(_caches)
+        upstream = {k: dict(v) for k, v in _upstream.items()}
+
+    for key, help_text in [
+        ('calls', 'Dash callback requests.'),
+        ('errors', 'Dash callback requests that failed.'),
+        ('secs', 'Time spent in Dash callbacks.'),
+        ('bytes', 'Size of Dash callback responses.'),
+    ]:
+        suffix = {'secs': 'seconds', 'calls': 'calls'}.get(key, key)
+        _metric(
+            f'garjus_dashboard_callback_{suffix}_total',
+            help_text,
+            [({'callback': k}, v[key]) for k, v in callbacks.items()])
+
+    _metric(
+        'garjus_dashboard_cache_total',
+        'Cache lookups by result.',
+        [({'cache': k[0], 'result': k[1]}, v) for k, v in caches.items()])
+
+    for key, help_text in [
+        ('requests', 'Requests to upstream services.'),
+        ('errors', 'Requests to upstream services that failed.'),
+        ('secs', 'Time waiting for upstream services.'),
+    ]:
+        suffix = 'seconds' if key == 'secs' else key
+        _metric(
+            f'garjus_dashboard_upstream_{suffix}_total',
+            help_text,
+            [({'service': k}, v[key]) for k, v in upstream.items()])
+
+    return '\n'.join(lines) + '\n'
+
+
+def is_admin():
+    """True if the current request may see metrics."""
+    if not hasattr(current_app, 'login_manager'):
+        # No logins, only the user running the dashboard
+        return request.remote_addr in LOCAL_ADDRS
+
+    admins = os.environ.get(ADMINS_ENV, DEFAULT_ADMINS).split(',')
+
+    return current_user.is_authenticated and current_user.id in admins
+
+
+def instrument(server):
+    """Record callback metrics on the Flask server and add the routes."""
+    _instrument_redcap()
+
+    @server.before_request
+    def _start_timer():
+        if request.path.endswith(CALLBACK_PATH):
+            g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def _record(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            body = request.get_json(silent=True) or {}
+            record_callback(
+                _callback_name(body.get('output', 'unknown')),
+                time.perf_counter() - start,
+                response.calculate_content_length() or 0,
+                error=response.status_code >= 500)
+
+        return response
+
+    @server.teardown_request
+    def _record_error(exc):
+        # after_request is skipped when the callback raised
+        start = g.pop('metrics_start', None)
+        if exc is not None and start is not None:
+            body = request.get_json(silent=True) or {}
+            record_callback(
+                _callback_name(body.get('output', 'unknown')),
+                time.perf_counter() - start,
+                error=True)
+
+    @server.route('/admin/perf')
+    def perf_panel():
+        if not is_admin():
+            abort(403)
+
+        tables = [
+            ('Callbacks', callback_table()),
+            ('Caches', cache_table()),
+            ('REDCap and XNAT requests', upstream_table()),
+        ]
+
+        return render_template(
+            'perf.html',
+            pid=os.getpid(),
+            tables=[(t, df.to_html(
+                index=False, classes='table table-sm table-striped')) for t, df in tables])
+
+    if os.environ.get(PROMETHEUS_ENV):
+        @server.route('/metrics')
+        def prometheus_metrics():
+            if not is_admin():
+                abort(403)
+
+            return Response(
+                prometheus_text(), mimetype='text/plain; version=0.0.4')
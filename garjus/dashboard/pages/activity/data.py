@@ -4,8 +4,9 @@ from datetime import datetime
 
 import pandas as pd
 
-from .. import utils
+from .. import utils, store
 from ....garjus import Garjus
+from ..pool import get_garjus
 
 
 logger = logging.getLogger('dashboard.activity.data')
@@ -43,7 +44,7 @@ def get_data(proj_filter):
     startdate = datetime.today() - relativedelta(months=1)
     startdate = startdate.strftime('%Y-%m-%d')
 
-    g = Garjus()
+    g = get_garjus()
 
     if not g.redcap_enabled():
         logger.debug('redcap not enabled, no activity data')
@@ -136,6 +137,15 @@ def run_refresh(filename):
 
 
 def load_data(refresh=False):
+    # Includes XNAT data so kept per user, file is shared by workers
+    return store.get(
+        store.user_key('activity'),
+        lambda: _load_file(refresh),
+        maxmins=None,
+        refresh=refresh)
+
+
+def _load_file(refresh):
     filename = get_filename()
 
     if refresh or not os.path.exists(filename):
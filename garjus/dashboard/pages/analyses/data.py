@@ -2,7 +2,9 @@ import logging
 import os
 import pandas as pd
 
+from .. import utils
 from ....garjus import Garjus
+from ..pool import get_garjus
 
 
 logger = logging.getLogger('dashboard.analyses.data')
@@ -29,7 +31,7 @@ def run_refresh(filename):
 
 
 def load_options():
-    garjus = Garjus()
+    garjus = get_garjus()
     proj_options = garjus.projects()
 
     return proj_options
@@ -52,11 +54,11 @@ def read_data(filename):
 
 def save_data(df, filename):
     # save to cache
-    df.to_pickle(filename)
+    utils.save_data(df, filename)
 
 
 def get_data():
-    g = Garjus()
+    g = get_garjus()
 
     if not g.rcq_enabled():
         logger.debug('rcq not enabled, no analyses data')
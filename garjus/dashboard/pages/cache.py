@@ -0,0 +1,267 @@
+"""Dashboard data cached per project, one partition file per project.
+
+Partitions are written to a temporary file and renamed into place so
+readers never see a partial file. Building a partition holds a lock on
+that project so concurrent workers wait for the first one instead of
+loading the same project again. Partitions are Parquet when pyarrow can
+store the frame, otherwise pickle.
+
+Saved partitions are always served right away. Partitions getting old are
+refreshed in a background thread, so callbacks only wait when a project
+has never been loaded or Refresh was clicked. Empty data is never saved,
+since loaders return empty data when loading fails.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from flask import has_request_context, copy_current_request_context
+
+try:
+    import fcntl
+except ImportError:
+    # No file locking on this platform, workers may duplicate loads
+    fcntl = None
+
+from ...garjus import Garjus
+from .. import metrics
+
+
+logger = logging.getLogger('dashboard.cache')
+
+
+FORMATS = ['parquet', 'pkl']
+
+# Partitions older than this part of maxmins are refreshed in background
+REFRESH_AHEAD = 0.8
+
+# Partitions being refreshed by this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _in_background(func, *args):
+    # Keep the request context so the thread connects as the current user
+    if has_request_context():
+        func = copy_current_request_context(func)
+
+    threading.Thread(target=func, args=args, daemon=True).start()
+
+
+class _Lock:
+    """Exclusive lock on a file, held for the with block."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.filename, 'a')
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+        self._file.close()
+
+
+class ProjectCache:
+    """Per-project partitions of the data loaded by get_data(projects).
+
+    Partitions older than REFRESH_AHEAD of maxmins are reloaded in the
+    background, refresh loads all the requested projects again now.
+    """
+
+    def __init__(self, name, get_data, maxmins=60):
+        self.name = name
+        self.get_data = get_data
+        self.maxmins = maxmins
+
+    def datadir(self):
+        datadir = f'{Garjus.userdir()}/DATA/{self.name}'
+        os.makedirs(datadir, exist_ok=True)
+        return datadir
+
+    def _base(self, project):
+        return os.path.join(self.datadir(), project)
+
+    def _existing(self, base):
+        # Path and time of saved partition, None if not found
+        for ext in FORMATS:
+            filename = f'{base}.{ext}'
+            if os.path.exists(filename):
+                return filename, os.path.getmtime(filename)
+
+        return None, None
+
+    def _age(self, mtime):
+        return (time.time() - mtime) / 60
+
+    def _read(self, filename):
+        if filename.endswith('.parquet'):
+            return pd.read_parquet(filename)
+
+        return pd.read_pickle(filename)
+
+    def _write(self, df, base):
+        tmpfile = f'{base}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+        try:
+            df.to_parquet(tmpfile, index=False)
+            ext = 'parquet'
+        except Exception as err:
+            logger.debug(f'cannot save parquet, using pickle:{base}:{err}')
+            df.to_pickle(tmpfile)
+            ext = 'pkl'
+
+        os.replace(tmpfile, f'{base}.{ext}')
+
+        # Remove a partition saved in the other format
+        for other in FORMATS:
+            if other != ext and os.path.exists(f'{base}.{other}'):
+                os.remove(f'{base}.{other}')
+
+    def _rebuild(self, project, base, since):
+        with _Lock(f'{base}.lock'):
+            # Another worker may have saved it since we asked for it
+            filename, mtime = self._existing(base)
+            if mtime is not None and mtime >= since:
+                logger.debug(f'partition loaded by another worker:{project}')
+                return self._read(filename)
+
+            logger.info(f'loading partition:{self.name}:{project}')
+            df = self.get_data([project])
+
+            if df.empty:
+                # Load may have failed, not saved so the next load tries again
+                logger.info(f'nothing loaded, not saving:{self.name}:{project}')
+                if filename:
+                    return self._read(filename)
+
+                return df
+
+            self._write(df, base)
+
+        return df
+
+    def _refresh_background(self, project, base):
+        with _refreshing_lock:
+            if base in _refreshing:
+                return
+
+            _refreshing.add(base)
+
+        def _refresh():
+            try:
+                self._rebuild(project, base, time.time())
+            except Exception as err:
+                logger.error(f'background refresh failed:{project}:{err}')
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(base)
+
+        logger.debug(f'refreshing in background:{self.name}:{project}')
+        _in_background(_refresh)
+
+    def _load_project(self, project, refresh=False):
+        base = self._base(project)
+        filename, mtime = self._existing(base)
+
+        if filename and not refresh:
+            if self._age(mtime) > self.maxmins * REFRESH_AHEAD:
+                # Serve what we have, refresh for next time
+                self._refresh_background(project, base)
+
+            metrics.count_cache(self.name, True)
+            return self._read(filename)
+
+        metrics.count_cache(self.name, False)
+        return self._rebuild(project, base, time.time())
+
+    def load(self, projects, refresh=False):
+        """Return data of projects, loading only missing or old projects."""
+        frames = [self._load_project(p, refresh) for p in sorted(projects)]
+        frames = [x for x in frames if not x.empty]
+
+        if not frames:
+            return self.get_data([])
+
+        return pd.concat(frames, ignore_index=True)
+
+    def version(self, projects):
+        """Saved time of each partition, changes when any are reloaded."""
+        return tuple(
+            (p, self._existing(self._base(p))[1]) for p in sorted(projects))
+
+    def status(self, projects):
+        """Age in minutes of oldest partition and if any are refreshing.
+
+        Age is None if none of the projects are saved. Old partitions are
+        refreshed in background, so polling status keeps them current.
+        """
+        ages = []
+        refreshing = False
+
+        for p in projects:
+            base = self._base(p)
+            _, mtime = self._existing(base)
+            if mtime is None:
+                continue
+
+            ages.append(self._age(mtime))
+            if ages[-1] > self.maxmins * REFRESH_AHEAD:
+                self._refresh_background(p, base)
+
+            with _refreshing_lock:
+                refreshing = refreshing or base in _refreshing
+
+        return {
+            'age': int(max(ages)) if ages else None,
+            'refreshing': refreshing,
+        }
+
+
+class Memo:
+    """Values kept in memory by this process, least recently used dropped.
+
+    Keys must include everything the value depends on, such as the
+    version of the data and the filters applied.
+    """
+
+    def __init__(self, maxsize=8, name='memo'):
+        self.maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, make):
+        """Value of key, calling make() to get it if not kept."""
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                self.hits += 1
+                metrics.count_cache(self.name, True)
+                return self._values[key]
+
+            self.misses += 1
+
+        metrics.count_cache(self.name, False)
+
+        value = make()
+
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+        return value
@@ -5,8 +5,8 @@ from datetime import datetime
 
 import pandas as pd
 
-from .. import queue, issues, reports
-from ....garjus import Garjus
+from .. import queue, issues, reports, store
+from ..pool import get_garjus
 
 
 logger = logging.getLogger('dashboard.hub.data')
@@ -19,26 +19,40 @@ def _get_reports_data(refresh=False):
 
 def _get_automations_data(g=None, refresh=False):
     if g is None:
-        g = Garjus()
+        g = get_garjus()
 
     df = pd.DataFrame()
     return df
 
 
 def _get_processing_data(g=None, refresh=False):
+    return store.get(
+        store.redcap_key('processing'),
+        lambda: _load_processing_data(g),
+        refresh=refresh)
+
+
+def _load_processing_data(g=None):
     if g is None:
-        g = Garjus()
+        g = get_garjus()
 
     df = g.processing_protocols()
     return df
 
 
 def _get_activity_data(g=None, refresh=False):
+    return store.get(
+        store.redcap_key('hubactivity'),
+        lambda: _load_activity_data(g),
+        refresh=refresh)
+
+
+def _load_activity_data(g=None):
     startdate = datetime.today() - relativedelta(days=7)
     startdate = startdate.strftime('%Y-%m-%d')
 
     if g is None:
-        g = Garjus()
+        g = get_garjus()
 
     if not g.redcap_enabled():
         return pd.DataFrame(columns=g.column_names('activity'))
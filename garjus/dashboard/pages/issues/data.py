@@ -4,6 +4,8 @@ import os
 import pandas as pd
 
 from ....garjus import Garjus
+from ..pool import get_garjus
+from .. import utils, store
 from ..utils import file_age
 
 
@@ -24,7 +26,7 @@ def get_filename():
 
 
 def get_data():
-    g = Garjus()
+    g = get_garjus()
 
     if not g.redcap_enabled():
         logger.debug('redcap not enabled, no issues data')
@@ -109,6 +111,15 @@ def run_refresh():
 
 
 def load_data(refresh=False, maxmins=5):
+    # Shared by pages and users in this process, file is shared by workers
+    return store.get(
+        store.redcap_key('issues'),
+        lambda: _load_file(refresh, maxmins),
+        maxmins=maxmins,
+        refresh=refresh)
+
+
+def _load_file(refresh, maxmins):
     filename = get_filename()
 
     if not os.path.exists(filename):
@@ -141,7 +152,7 @@ def read_data(filename):
 
 def save_data(df, filename):
     # save to cache
-    df.to_pickle(filename)
+    utils.save_data(df, filename)
 
 
 def filter_data(df, projects, categories):
@@ -0,0 +1,85 @@
+"""Garjus connections shared by callbacks, one per user per process.
+
+Connecting Garjus logs in to XNAT and checks both REDCap projects, so
+callbacks reuse the connection of the current user instead. Connections
+not used for IDLE_MINS are dropped, and all are made again after MAX_MINS
+so cached project lists and credentials do not get too old.
+"""
+import logging
+import threading
+import time
+
+from flask_login import current_user
+
+from ...garjus import Garjus
+from .. import metrics
+
+
+logger = logging.getLogger('dashboard.pool')
+
+
+IDLE_MINS = 20
+
+MAX_MINS = 60
+
+# username -> connection
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+class _Connection:
+    def __init__(self, garjus):
+        self.garjus = garjus
+        self.created = time.time()
+        self.used = self.created
+
+    def expired(self, now):
+        return (
+            (now - self.used) / 60 > IDLE_MINS or
+            (now - self.created) / 60 > MAX_MINS)
+
+
+def _username():
+    try:
+        if current_user.is_authenticated:
+            return current_user.id
+    except Exception as err:
+        logger.debug(err)
+
+    return 'UnknownUser'
+
+
+def _expire(now):
+    for user in [u for u, c in _pool.items() if c.expired(now)]:
+        logger.debug(f'dropping connection:{user}')
+        del _pool[user]
+
+
+def get_garjus():
+    """Garjus connected as the current user, reused if already connected."""
+    user = _username()
+    now = time.time()
+
+    with _pool_lock:
+        _expire(now)
+        conn = _pool.get(user)
+        if conn:
+            conn.used = now
+            return conn.garjus
+
+    # Connect without holding the lock, other users need not wait
+    logger.debug(f'connecting:{user}')
+    garjus = Garjus()
+    metrics.instrument_garjus(garjus)
+
+    with _pool_lock:
+        # Keep the first if another callback connected at the same time
+        conn = _pool.setdefault(user, _Connection(garjus))
+        conn.used = time.time()
+        return conn.garjus
+
+
+def discard(username=None):
+    """Drop the connection of a user, default current, e.g. on logout."""
+    with _pool_lock:
+        _pool.pop(username or _username(), None)
@@ -26,12 +26,14 @@ import plotly
 import plotly.graph_objs as go
 import plotly.subplots
 from dash import dcc, html, dash_table as dt
-from dash import Input, Output, callback
+from dash import Input, Output, State, callback
 import dash_bootstrap_components as dbc
 
-from ....garjus import Garjus
-from .. import utils
-from ..shared import QASTATUS2COLOR, RGB_DKBLUE, GWIDTH
+from ..pool import get_garjus
+from .. import utils, table
+from ..cache import Memo
+from ..shared import QASTATUS2COLOR, RGB_DKBLUE, GWIDTH, FRESHNESS_SECS
+from ..shared import WEBGL_POINTS, MAX_POINTS
 from . import data
 
 
@@ -56,6 +58,13 @@ LEGEND2 = '''
 
 MOD2EMO = {'MR': '🧠', 'PET': '☢️', 'EEG': '🤯'}
 
+# Filtered data and pivots kept in memory per process
+FILTERED = Memo(maxsize=8, name='qa.filtered')
+PIVOTS = Memo(maxsize=8, name='qa.pivots')
+
+# Link columns shown as icons
+LINK2ICON = {'NIFTI': '⬇️', 'JSON': '⬇️', 'EDAT': '⬇️', 'PDF': '📊', 'LOG': '📄'}
+
 # command line examples
 TIPS_MARKDOWN = '''
     &nbsp;
@@ -136,14 +145,13 @@ def _get_graph_content(dfp):
     dfp_copy = dfp_copy.reset_index().copy()
 
     # don't need subject
-    dfp_copy = dfp_copy.drop(columns=['SUBJECT', 'SUBJECTLINK', 'AGE', 'SEX', 'GROUP'])
+    dfp_copy = dfp_copy.drop(columns=['SUBJECT', 'AGE', 'SEX', 'GROUP'])
 
     # use pandas melt function to unpivot our pivot table
     df = pd.melt(
         dfp_copy,
         id_vars=(
             'SESSION',
-            'SESSIONLINK',
             'PROJECT',
             'DATE',
             'SITE',
@@ -158,7 +166,8 @@ def _get_graph_content(dfp):
         columns='STATUS',
         values='SESSION',
         aggfunc='count',
-        fill_value=0)
+        fill_value=0,
+        observed=True)
 
     # sort so scans are first, then assessor
     scan_type = []
@@ -211,7 +220,8 @@ def _get_graph_content(dfp):
         index='PROJECT',
         values='SESSION',
         aggfunc=pd.Series.nunique,
-        fill_value=0)
+        fill_value=0,
+        observed=True)
 
     fig = plotly.subplots.make_subplots(rows=1, cols=1)
     fig.update_layout(margin=dict(l=40, r=40, t=40, b=40))
@@ -263,6 +273,20 @@ def _sessionsbytime_figure(df, selected_groupby):
     import plotly.express as px
     palette = cycle(px.colors.qualitative.Plotly)
 
+    # Count before sampling so names show all sessions
+    counts = df.groupby(['MODALITY', 'SESSTYPE'], observed=True).size()
+
+    # Too many points for SVG, plot a sample with WebGL markers
+    webgl = len(df) > WEBGL_POINTS
+    df = utils.sample_rows(df, MAX_POINTS)
+    if webgl:
+        rng = np.random.default_rng(0)
+        groups = sorted(df[selected_groupby].astype(str).unique())
+        ypos = {x: i for i, x in enumerate(groups)}
+        fig.update_yaxes(tickvals=list(ypos.values()), ticktext=groups)
+        if len(df) < counts.sum():
+            fig.update_layout(title_text=f'Sample of {len(df)}/{counts.sum()}')
+
     for mod, sesstype in itertools.product(df.MODALITY.unique(), df.SESSTYPE.unique()):
 
         # Get subset for this session type
@@ -272,6 +296,8 @@ def _sessionsbytime_figure(df, selected_groupby):
         if dfs.empty:
             continue
 
+        _name = '{} {} ({})'.format(sesstype, mod, counts[(mod, sesstype)])
+
         # Create boxplot for this var and add to figure
         # Default to the jittered boxplot with no boxes
 
@@ -300,9 +326,31 @@ def _sessionsbytime_figure(df, selected_groupby):
         # Plot this session type
         _row = 1
         _col = 1
+        if webgl:
+            # Box jitter is SVG only, so jitter around each row ourselves
+            _y = dfs[selected_groupby].astype(str).map(ypos)
+            _y = _y + rng.uniform(-0.35, 0.35, len(dfs))
+            fig.append_trace(
+                go.Scattergl(
+                    name=_name,
+                    x=dfs['DATE'],
+                    y=_y,
+                    mode='markers',
+                    text=dfs['SESSION'],
+                    marker={
+                        'symbol': symb,
+                        'color': _rgba,
+                        'size': 8,
+                        'line': dict(width=1, color=_color)
+                    },
+                ),
+                _row,
+                _col)
+            continue
+
         fig.append_trace(
             go.Box(
-                name='{} {} ({})'.format(sesstype, mod, len(dfs)),
+                name=_name,
                 x=dfs['DATE'],
                 y=dfs[selected_groupby],
                 boxpoints='all',
@@ -359,6 +407,15 @@ def get_content():
                 ),
                 align='center',
             ),
+            dbc.Col(
+                [
+                    html.Div(id='label-qa-freshness'),
+                    dcc.Interval(
+                        id='interval-qa-freshness',
+                        interval=FRESHNESS_SECS * 1000),
+                ],
+                align='center',
+            ),
             dbc.Col(
                 dbc.Switch(
                     id='switch-qa-autofilter',
@@ -488,12 +545,14 @@ def get_content():
         dt.DataTable(
             columns=[],
             data=[],
-            filter_action='native',
-            #page_current=0,
-            #page_size=1000,
-            #page_action='custom',
-            page_action='none',
-            sort_action='native',
+            filter_action='custom',
+            filter_query='',
+            page_current=0,
+            page_size=table.PAGE_SIZE,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='multi',
+            sort_by=[],
             id='datatable-qa',
             style_table={
                 'overflowY': 'scroll',
@@ -530,6 +589,15 @@ def get_content():
             export_columns='visible'
         ),
         dbc.Label('Get ready...', id='label-qa-rowcount2'),
+        dbc.Button(
+            'Download all',
+            id='button-qa-download',
+            outline=True,
+            color='primary',
+            size='sm',
+        ),
+        dcc.Download(id='download-qa'),
+        dcc.Store(id='store-qa-table'),
         #dcc.Markdown(TIPS_MARKDOWN),
         html.Div([
             html.P(
@@ -579,20 +647,29 @@ def get_metastatus(status):
 
 
 def qa_pivot(df):
-    df = df.fillna('')
+    df = data.fill_blank(df)
 
     dfp = df.pivot_table(
         index=(
-            'SESSION', 'SESSIONLINK', 'SUBJECT', 'SUBJECTLINK', 'PROJECT',
+            'SESSION', 'SUBJECT', 'PROJECT',
             'DATE', 'SESSTYPE', 'SITE', 'GROUP', 'AGE', 'SEX', 'MODALITY', 'NOTE'),
         columns='TYPE',
         values='STATUS',
-        aggfunc=lambda x: ''.join(x))
+        aggfunc=lambda x: ''.join(x),
+        observed=True)
 
     # and return our pivot table
     return dfp
 
 
+@callback(
+    Output('label-qa-freshness', 'children'),
+    [Input('interval-qa-freshness', 'n_intervals'),
+     Input('dropdown-qa-proj', 'value')])
+def update_freshness(n_intervals, selected_proj):
+    return utils.freshness_text(data.load_status(selected_proj))
+
+
 # This is where the data gets initialized
 def load_data(projects=[], refresh=False, hidetypes=True):
     if projects is None:
@@ -610,32 +687,34 @@ def load_options(df):
         fname = f'{demodir}/qadata.pkl'
         projects = data.read_data(fname).PROJECT.unique()
         logger.info(f'{projects=}')
+        host = ''
     else:
-        garjus = Garjus()
+        garjus = get_garjus()
         projects = garjus.projects()
-    
+        host = garjus.xnat_host()
+
     sesstypes = []
     proctypes = []
     scantypes = []
 
     # Filter to selected
-    scantypes = df.SCANTYPE.unique()
+    scantypes = df.SCANTYPE.dropna().unique()
 
     # Remove blanks and sort
     scantypes = [x for x in scantypes if x]
     scantypes = sorted(scantypes)
 
     # Now sessions
-    sesstypes = df.SESSTYPE.unique()
+    sesstypes = df.SESSTYPE.dropna().unique()
     sesstypes = [x for x in sesstypes if x]
     sesstypes = sorted(sesstypes)
 
     # And finally proc
-    proctypes = df.PROCTYPE.unique()
+    proctypes = df.PROCTYPE.dropna().unique()
     proctypes = [x for x in proctypes if x]
     proctypes = sorted(proctypes)
 
-    return projects, sesstypes, proctypes, scantypes
+    return projects, sesstypes, proctypes, scantypes, host
 
 
 # Initialize the callbacks for the app
@@ -651,18 +730,18 @@ def load_options(df):
 # options for the assessor projects dropdown
 # options for the assessor scans dropdown
 # options for the assessor sessions dropdown
-# data for the table
+# key of the table saved for paging
+# columns for the table
 # content for the graph tabs
 @callback(
     [Output('dropdown-qa-proc', 'options'),
      Output('dropdown-qa-scan', 'options'),
      Output('dropdown-qa-sess', 'options'),
      Output('dropdown-qa-proj', 'options'),
-     Output('datatable-qa', 'data'),
+     Output('store-qa-table', 'data'),
      Output('datatable-qa', 'columns'),
+     Output('datatable-qa', 'page_current'),
      Output('div-qa-graph', 'children'),
-     Output('label-qa-rowcount1', 'children'),
-     Output('label-qa-rowcount2', 'children'),
      ],
     [Input('dropdown-qa-proc', 'value'),
      Input('dropdown-qa-scan', 'value'),
@@ -705,13 +784,19 @@ def update_qa(
 
     logger.debug(f'loading data:{selected_proj}')
     try:
+        # Get version before loading so newer data is never kept as older
+        version = data.load_version(selected_proj)
         df = load_data(
             projects=selected_proj,
             refresh=refresh,
             hidetypes=selected_autofilter)
+
+        if refresh:
+            # Reloaded, so what is kept for the old version is not shown
+            version = data.load_version(selected_proj)
     except Exception as err:
         logger.debug(f'failed to load data:{err}')
-        return [[], [], [], [], [], [], 'No data', 'Credentials Expired', 'Refresh to Login']
+        return [[], [], [], [], {'error': 'Credentials Expired'}, [], 0, 'No data']
 
     # Truncate NOTE
     if 'NOTE' in df:
@@ -719,7 +804,7 @@ def update_qa(
 
     # Update lists of possible options for dropdowns (could have changed)
     # make these lists before we filter what to display
-    proj, sess, proc, scan = load_options(df)
+    proj, sess, proc, scan, host = load_options(df)
 
     # Remove from selected what is no longer an option
     if selected_sess:
@@ -735,28 +820,40 @@ def update_qa(
     proc = utils.make_options(proc)
     scan = utils.make_options(scan)
 
-    # Filter data based on dropdown values
-    df = data.filter_data(
-        df,
+    # Filter data based on dropdown values, reusing if already filtered
+    key = _memo_key(
+        version,
+        selected_autofilter,
         selected_proj,
         selected_proc,
         selected_scan,
         selected_starttime,
         selected_endtime,
-        selected_sess)
+        selected_sess,
+        selected_modality,
+        selected_procstatus)
 
-    if not df.empty and selected_modality:
-        df = df[df.MODALITY.isin(selected_modality + ['SGP'])]
+    df = FILTERED.get(key, lambda: _filter_data(
+        df,
+        selected_proj,
+        selected_proc,
+        selected_scan,
+        selected_starttime,
+        selected_endtime,
+        selected_sess,
+        selected_modality,
+        selected_procstatus))
 
-    if not df.empty and selected_procstatus:
-        df = df[df.STATUS.isin(selected_procstatus)]
+    def _pivot(df, name):
+        # Copy so changes to the table do not change the kept pivot
+        return PIVOTS.get(key + (name,), lambda: qa_pivot(df)).copy()
 
     if df.empty:
-        records = []
+        rows = pd.DataFrame()
         columns = []
     elif selected_pivot == 'proj':
         # Get the qa pivot from the filtered data
-        dfp = qa_pivot(df)
+        dfp = _pivot(df, 'all')
 
         if selected_graph:
             logger.debug('making graph')
@@ -792,6 +889,7 @@ def update_qa(
                     values=show_col,
                     aggfunc=lambda x: x.mode().iat[0],
                     fill_value='E',
+                    observed=True,
                 )
             else:
                 dfp = dfp.fillna('')
@@ -800,6 +898,7 @@ def update_qa(
                     values=show_col,
                     aggfunc=lambda x: x.mode().iat[0],
                     fill_value=np.nan,
+                    observed=True,
                 )
 
             # Replace chars with emojis
@@ -829,11 +928,13 @@ def update_qa(
 
                 dfp2 = dfp[['PROJECT', 'SESSTYPE', 'MODALITY']].copy()
                 dfp2 = dfp2.drop_duplicates()
-                dfp2['SESSIONS'] = dfp2['MODALITY'].map(MOD2EMO).fillna('?')
+                dfp2['SESSIONS'] = dfp2['MODALITY'].astype(object).map(
+                    MOD2EMO).fillna('?')
                 dfp2 = dfp2.pivot_table(
                     index=('PROJECT'),
                     values='SESSIONS',
-                    aggfunc=lambda x: ''.join(x))
+                    aggfunc=lambda x: ''.join(x),
+                    observed=True)
 
                 dfp = dfp.pivot_table(
                     index=('PROJECT'),
@@ -841,6 +942,7 @@ def update_qa(
                     values='SESSION',
                     aggfunc='count',
                     fill_value='',
+                    observed=True,
                 )
 
                 # And smack it together now
@@ -854,17 +956,18 @@ def update_qa(
                     values='SESSION',
                     aggfunc='count',
                     fill_value='',
+                    observed=True,
                 )
 
         # Format as column names and record dictionaries for dash table
         columns = utils.make_columns(selected_cols)
-        records = dfp.reset_index().to_dict('records')
+        rows = dfp.reset_index()
 
     elif selected_pivot == 'subj':
         # row per subject
 
         # Get the qa pivot from the filtered data
-        dfp = qa_pivot(df)
+        dfp = _pivot(df, 'all')
 
         if selected_graph:
             # Make graphs
@@ -896,13 +999,14 @@ def update_qa(
             typecount = len(dfp.SESSTYPE.unique())
             if typecount < 10:
                 # agg to most common value (mode) per sesstype per show_col
-                dfp = dfp.fillna('')
+                dfp = data.fill_blank(dfp)
                 dfp = dfp.pivot_table(
-                    index=('PROJECT', 'SUBJECT', 'SUBJECTLINK'),
+                    index=('PROJECT', 'SUBJECT'),
                     columns='SESSTYPE',
                     values=show_col,
                     aggfunc=lambda x: x.mode().iat[0],
                     fill_value='',
+                    observed=True,
                 )
 
                 if typecount > 1:
@@ -930,9 +1034,10 @@ def update_qa(
             else:
                 # aggregrate to most common value (mode)
                 dfp = dfp.pivot_table(
-                    index=('PROJECT', 'SUBJECT', 'SUBJECTLINK'),
+                    index=('PROJECT', 'SUBJECT'),
                     values=show_col,
                     aggfunc=lambda x: x.mode().iat[0],
+                    observed=True,
                 )
 
             for p in show_col:
@@ -956,16 +1061,17 @@ def update_qa(
 
             dfp = dfp.sort_values('MODALITY')
 
-            dfp['EMO'] = dfp['MODALITY'].map(MOD2EMO).fillna('?')
+            dfp['EMO'] = dfp['MODALITY'].astype(object).map(MOD2EMO).fillna('?')
 
             # Pivot to column for each session type
             show_col = list(dfp.SESSTYPE.unique())
             selected_cols = ['SUBJECT', 'PROJECT'] + show_col
             dfp = dfp.pivot_table(
-                index=('SUBJECT', 'PROJECT', 'SUBJECTLINK'),
+                index=('SUBJECT', 'PROJECT'),
                 values='EMO',
                 columns='SESSTYPE',
-                aggfunc=lambda x: ''.join(x))
+                aggfunc=lambda x: ''.join(x),
+                observed=True)
 
             for p in show_col:
                 if 'E' in selected_procstatus:
@@ -973,14 +1079,7 @@ def update_qa(
 
         # Format as column names and record dictionaries for dash table
         columns = utils.make_columns(selected_cols)
-        records = dfp.reset_index().to_dict('records')
-
-        # Format records
-        for r in records:
-            if r['SUBJECT'] and 'SUBJECTLINK' in r:
-                _subj = r['SUBJECT']
-                _link = r['SUBJECTLINK']
-                r['SUBJECT'] = f'[{_subj}]({_link})'
+        rows = dfp.reset_index()
 
         # Format columns
         for i, c in enumerate(columns):
@@ -1008,42 +1107,19 @@ def update_qa(
             'SENSE',
             'MB',
             'FRAMES',
-            'NIFTI',
-            'JSON',
-            'EDAT',
         ]
 
         # Only include columns that have values
         selected_cols = [x for x in selected_cols if (df[x].count() - df[x].eq('').sum()) > 0]
 
+        # Links are made for rows shown, include if any scan has resource
+        resources = df.RESOURCES.fillna('').astype(str)
+        selected_cols += [
+            x for x in data.SCAN_RESOURCES if resources.str.contains(x).any()]
+
         # Format as column names and record dictionaries for dash table
         columns = utils.make_columns(selected_cols)
-        records = df.reset_index().to_dict('records')
-
-        # Format records
-        for r in records:
-
-            if r['SESSION'] and 'SESSIONLINK' in r:
-                _sess = r['SESSION']
-                _link = r['SESSIONLINK']
-                r['SESSION'] = f'[{_sess}]({_link})'
-
-            if r['SUBJECT'] and 'SUBJECTLINK' in r:
-                _subj = r['SUBJECT']
-                _link = r['SUBJECTLINK']
-                r['SUBJECT'] = f'[{_subj}]({_link})'
-
-            if r['NIFTI']:
-                _link = r['NIFTI']
-                r['NIFTI'] = f'[⬇️]({_link})'
-
-            if r['EDAT']:
-                _link = r['EDAT']
-                r['EDAT'] = f'[⬇️]({_link})'
-
-            if r['JSON']:
-                _link = r['JSON']
-                r['JSON'] = f'[⬇️]({_link})'
+        rows = df.reset_index()
 
         # Format columns
         for i, c in enumerate(columns):
@@ -1056,7 +1132,7 @@ def update_qa(
         df = df.dropna(subset='PROCTYPE')
         df = df[df.PROCTYPE != '']
 
-        df['STATUS'] = df['STATUS'].replace({
+        df['STATUS'] = df['STATUS'].astype(object).replace({
             'P': '✅',
             'X': '🩷',
             'Q': '🟩',
@@ -1083,28 +1159,7 @@ def update_qa(
 
         # Format as column names and record dictionaries for dash table
         columns = utils.make_columns(selected_cols)
-        records = df.reset_index().to_dict('records')
-
-        # Format records
-        for r in records:
-
-            if r['SESSION'] and 'SESSIONLINK' in r:
-                _sess = r['SESSION']
-                _link = r['SESSIONLINK']
-                r['SESSION'] = f'[{_sess}]({_link})'
-
-            if r['SUBJECT'] and 'SUBJECTLINK' in r:
-                _subj = r['SUBJECT']
-                _link = r['SUBJECTLINK']
-                r['SUBJECT'] = f'[{_subj}]({_link})'
-
-            if r['PDF']:
-                _link = r['PDF']
-                r['PDF'] = f'[📊]({_link})'
-
-            if r['LOG']:
-                _link = r['LOG']
-                r['LOG'] = f'[📄]({_link})'
+        rows = df.reset_index()
 
         # Format columns
         for i, c in enumerate(columns):
@@ -1119,7 +1174,7 @@ def update_qa(
         df = df[df.SESSTYPE != 'SGP']
 
         # Get the qa pivot from the filtered data
-        dfp = qa_pivot(df)
+        dfp = _pivot(df, 'sessions')
 
         if selected_graph:
             graph_content = _get_graph_content(dfp)
@@ -1164,19 +1219,7 @@ def update_qa(
 
         # Format as column names and record dictionaries for dash table
         columns = utils.make_columns(selected_cols)
-        records = dfp.reset_index().to_dict('records')
-
-        # Format records
-        for r in records:
-            if r['SESSION'] and 'SESSIONLINK' in r:
-                _sess = r['SESSION']
-                _link = r['SESSIONLINK']
-                r['SESSION'] = f'[{_sess}]({_link})'
-
-            #if r['SUBJECT'] and 'SUBJECTLINK' in r:
-            #    _subj = r['SUBJECT']
-            #    _link = r['SUBJECTLINK']
-            #    r['SUBJECT'] = f'[{_subj}]({_link})'
+        rows = dfp.reset_index()
 
         # Format columns
         for i, c in enumerate(columns):
@@ -1185,14 +1228,136 @@ def update_qa(
                 columns[i]['type'] = 'text'
                 columns[i]['presentation'] = 'markdown'
 
+    # Save the table for paging, the browser only gets the key
+    key = table.save('qa', rows)
+
+    # Return table, figure, dropdown options
+    logger.debug('update_qa:returning data')
+
+    return [proc, scan, sess, proj, {'key': key, 'host': host}, columns, 0, graph_content]
+
+
+def _memo_key(*values):
+    # Selections are lists, make them hashable
+    return tuple(tuple(x) if isinstance(x, list) else x for x in values)
+
+
+def _filter_data(
+    df,
+    projects,
+    proctypes,
+    scantypes,
+    starttime,
+    endtime,
+    sesstypes,
+    modalities,
+    procstatus
+):
+    df = data.filter_data(
+        df,
+        projects,
+        proctypes,
+        scantypes,
+        starttime,
+        endtime,
+        sesstypes)
+
+    if not df.empty and modalities:
+        df = df[df.MODALITY.isin(modalities + ['SGP'])]
+
+    if not df.empty and procstatus:
+        df = df[df.STATUS.isin(procstatus)]
+
+    return df
+
+
+def _format_records(records, columns):
+    # Show links in markdown columns
+    markdown = [x['id'] for x in columns if x.get('presentation') == 'markdown']
+
+    for r in records:
+        for c in markdown:
+            if not r.get(c):
+                continue
+
+            if c in LINK2ICON:
+                r[c] = f'[{LINK2ICON[c]}]({r[c]})'
+            elif r.get(f'{c}LINK'):
+                r[c] = f'[{r[c]}]({r[c + "LINK"]})'
+
+    # Only send the columns shown
+    ids = [x['id'] for x in columns]
+
+    return [{c: r.get(c) for c in ids} for r in records]
+
+
+@callback(
+    [Output('datatable-qa', 'data'),
+     Output('datatable-qa', 'page_count'),
+     Output('label-qa-rowcount1', 'children'),
+     Output('label-qa-rowcount2', 'children'),
+     ],
+    [Input('store-qa-table', 'data'),
+     Input('datatable-qa', 'page_current'),
+     Input('datatable-qa', 'page_size'),
+     Input('datatable-qa', 'sort_by'),
+     Input('datatable-qa', 'filter_query'),
+     State('datatable-qa', 'columns'),
+     ])
+def update_qa_page(
+    stored,
+    page_current,
+    page_size,
+    sort_by,
+    filter_query,
+    columns
+):
+    if not stored:
+        return [[], 1, 'Get ready...', '']
+
+    if 'error' in stored:
+        return [[], 1, stored['error'], 'Refresh to Login']
+
+    dfp, page_count, count = table.get_page(
+        stored['key'], page_current, page_size, sort_by, filter_query)
+
+    if dfp is None:
+        return [[], 1, 'Refresh to reload', '']
+
+    # Links are only made for the rows shown
+    dfp = data.add_links(dfp, stored.get('host', ''))
+    records = _format_records(dfp.to_dict('records'), columns or [])
+
     # Count how many rows are in the table
-    _count = len(records)
-    if _count > 1:
-        rowcount = '{} rows'.format(len(records))
+    if count > 1:
+        rowcount = '{} rows'.format(count)
     else:
         rowcount = ''
 
-    # Return table, figure, dropdown options
-    logger.debug('update_qa:returning data')
+    return [records, page_count, rowcount, rowcount]
+
 
-    return [proc, scan, sess, proj, records, columns, graph_content, rowcount, rowcount]
+@callback(
+    Output('download-qa', 'data'),
+    [Input('button-qa-download', 'n_clicks'),
+     State('store-qa-table', 'data'),
+     State('datatable-qa', 'sort_by'),
+     State('datatable-qa', 'filter_query'),
+     State('datatable-qa', 'columns'),
+     ],
+    prevent_initial_call=True)
+def download_qa(n_clicks, stored, sort_by, filter_query, columns):
+    # The xlsx export only has the current page, this has all rows
+    if not stored or 'key' not in stored:
+        return None
+
+    df = table.export(
+        stored['key'],
+        sort_by,
+        filter_query,
+        [x['id'] for x in columns or []])
+
+    if df is None:
+        return None
+
+    return dcc.send_data_frame(df.to_csv, 'qa.csv', index=False)
@@ -5,8 +5,8 @@ import os
 import numpy as np
 import pandas as pd
 
-from ....garjus import Garjus
-from ..utils import file_age
+from ..pool import get_garjus
+from ..cache import ProjectCache
 
 
 logger = logging.getLogger('dashboard.qa.data')
@@ -43,63 +43,12 @@ QA_COLS = [
     'JOBDATE', 'TIMEUSED', 'MEMUSED', 'JOBNODE'
 ]
 
+# Few distinct values, stored as categoricals
+CATEGORY_COLS = [
+    'PROJECT', 'SITE', 'SESSTYPE', 'SCANTYPE', 'PROCTYPE', 'STATUS', 'MODALITY']
 
-def get_filename():
-    datadir = f'{Garjus.userdir()}/DATA'
-    filename = f'{datadir}/qadata.pkl'
-
-    try:
-        os.makedirs(datadir)
-    except FileExistsError:
-        pass
-
-    return filename
-
-
-def run_refresh(projects):
-    filename = get_filename()
-
-    # force a requery
-    df = get_data(projects)
-
-    save_data(df, filename)
-
-    return df
-
-
-def update_data(projects):
-    fname = get_filename()
-
-    # Load what we have now
-    df = read_data(fname)
-
-    # Remove projects not selected
-    df = df[df.PROJECT.isin(projects)]
-
-    # Find new projects in selected
-    new_projects = [x for x in projects if x not in df.PROJECT.unique()]
-
-    if new_projects:
-
-        # Save a file with new projects placeholders (hacky lock)
-        for p in new_projects:
-            _newdf = pd.DataFrame.from_records([{'PROJECT': p}])
-            df = pd.concat([df, _newdf], ignore_index=True)
-
-        save_data(df, fname)
-
-        # Load the new projects
-        dfp = get_data(new_projects)
-
-        # Merge our new data with old data
-        df = read_data(fname)
-        df = df[~df.PROJECT.isin(new_projects)]
-        df = pd.concat([df, dfp])
-
-        # Save it to file
-        save_data(df, fname)
-
-    return df
+# Scan resources with download links
+SCAN_RESOURCES = ['NIFTI', 'JSON', 'EDAT']
 
 
 def load_data(projects=[], refresh=False, maxmins=60, hidetypes=True):
@@ -110,22 +59,12 @@ def load_data(projects=[], refresh=False, maxmins=60, hidetypes=True):
         logger.info(f'reading demo data:{fname}')
         df = read_data(fname)
     else:
-        fname = get_filename()
-
-        if not os.path.exists(fname):
-            refresh = True
-        elif file_age(fname) > maxmins:
-            logger.info(f'refreshing, file age limit reached:{maxmins} minutes')
-            refresh = True
-
-        if refresh:
-            df = run_refresh(projects)
-        elif set(projects) != set(read_data(fname).PROJECT.unique()):
-            logger.debug('updating data')
-            # Different projects selected, update
-            df = update_data(projects)
-        else:
-            df = read_data(fname)
+        # Only projects not cached or older than maxmins are loaded
+        df = ProjectCache('qa', get_data, maxmins=maxmins).load(
+            projects, refresh=refresh)
+
+        # Projects with different categories are concatenated as objects
+        df = set_categories(df)
 
         if df.empty:
             return df
@@ -135,7 +74,7 @@ def load_data(projects=[], refresh=False, maxmins=60, hidetypes=True):
             scantypes = None
             assrtypes = None
 
-            garjus = Garjus()
+            garjus = get_garjus()
 
             if garjus.redcap_enabled():
                 # Load types
@@ -174,6 +113,14 @@ def load_data(projects=[], refresh=False, maxmins=60, hidetypes=True):
     return df
 
 
+def load_version(projects, maxmins=60):
+    return ProjectCache('qa', get_data, maxmins=maxmins).version(projects or [])
+
+
+def load_status(projects, maxmins=60):
+    return ProjectCache('qa', get_data, maxmins=maxmins).status(projects or [])
+
+
 def read_data(filename):
     df = pd.read_pickle(filename)
 
@@ -183,11 +130,6 @@ def read_data(filename):
     return df
 
 
-def save_data(df, filename):
-    # save to cache
-    df.to_pickle(filename)
-
-
 def get_data(projects):
     df = pd.DataFrame(columns=QA_COLS)
 
@@ -196,7 +138,7 @@ def get_data(projects):
         return df
 
     try:
-        garjus = Garjus()
+        garjus = get_garjus()
 
         # Load data
         logger.debug(f'load data:{projects}')
@@ -215,8 +157,7 @@ def get_data(projects):
         logger.debug(f'all loaded')
     except Exception as err:
         logger.error(f'load failed:{err}')
-        _cols = QA_COLS + ['DATE', 'SESSIONLINK', 'SUBJECTLINK']
-        return pd.DataFrame(columns=_cols)
+        return pd.DataFrame(columns=QA_COLS)
 
     logger.debug(f'merging data:{projects}')
 
@@ -248,6 +189,8 @@ def get_data(projects):
     df = pd.concat([assr_df[QA_COLS], scan_df[QA_COLS]], sort=False)
     df = pd.concat([df[QA_COLS], subj_df[QA_COLS]], sort=False)
 
+    # Keep the parsed date for filtering, show the text
+    df['DATETIME'] = df['DATE']
     df['DATE'] = df['DATE'].dt.strftime('%Y-%m-%d')
 
     if subjects is None:
@@ -271,55 +214,68 @@ def get_data(projects):
         unit='s',
         errors='coerce').dt.strftime("%-M:%S")
 
-    df['SESSIONLINK'] = garjus.xnat_host() + \
-        '/data/projects/' + df['PROJECT'] + \
-        '/subjects/' + df['SUBJECT'] + \
-        '/experiments/' + df['SESSION']
-
-    df['SUBJECTLINK'] = garjus.xnat_host() + \
-        '/data/projects/' + df['PROJECT'] + \
-        '/subjects/' + df['SUBJECT']
-
-    df['PDF'] = garjus.xnat_host() + \
-        '/data/projects/' + df['PROJECT'] + \
-        '/subjects/' + df['SUBJECT'] + \
-        '/experiments/' + df['SESSION'] + \
-        '/assessors/' + df['ASSR'] + \
-        '/out/resources/PDF/files/' + \
-        'report_' + df['ASSR'] + '.pdf'
-
-    df['LOG'] = garjus.xnat_host() + \
-        '/data/projects/' + df['PROJECT'] + \
-        '/subjects/' + df['SUBJECT'] + \
-        '/experiments/' + df['SESSION'] + \
-        '/assessors/' + df['ASSR'] + \
-        '/out/resources/OUTLOG/files/' + \
-        df['ASSR'] + '.txt'
-
-    df['NIFTI'] = garjus.xnat_host() + \
-        '/data/projects/' + df['PROJECT'] + \
-        '/subjects/' + df['SUBJECT'] + \
-        '/experiments/' + df['SESSION'] + \
-        '/scans/' + df['SCANID'] + \
-        '/resources/NIFTI/files?format=zip'
-
-    df['JSON'] = garjus.xnat_host() + \
-        '/data/projects/' + df['PROJECT'] + \
-        '/subjects/' + df['SUBJECT'] + \
-        '/experiments/' + df['SESSION'] + \
-        '/scans/' + df['SCANID'] + \
-        '/resources/JSON/files?format=zip'
-
-    df['EDAT'] = garjus.xnat_host() + \
-        '/data/projects/' + df['PROJECT'] + \
-        '/subjects/' + df['SUBJECT'] + \
-        '/experiments/' + df['SESSION'] + \
-        '/scans/' + df['SCANID'] + \
-        '/resources/EDAT/files?format=zip'
-
-    df.loc[df.RESOURCES.str.contains('EDAT') == False, 'EDAT'] = ''
-    df.loc[df.RESOURCES.str.contains('JSON') == False, 'JSON'] = ''
-    df.loc[df.RESOURCES.str.contains('NIFTI') == False, 'NIFTI'] = ''
+    return set_categories(df)
+
+
+def set_categories(df):
+    """Store the low cardinality columns as categoricals."""
+    for c in CATEGORY_COLS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype('category')
+
+    return df
+
+
+def fill_blank(df):
+    """Fill missing values with blank, adding blank to categories."""
+    cats = df.select_dtypes('category').columns
+    df = df.assign(**{
+        c: df[c].cat.add_categories('') for c in cats
+        if '' not in df[c].cat.categories})
+
+    return df.fillna('')
+
+
+def _link(*parts):
+    # Concatenate text and columns to a link
+    link = ''
+    for p in parts:
+        link = link + (p if isinstance(p, str) else p.astype(str))
+
+    return link
+
+
+def add_links(df, host):
+    """Add XNAT links to rows shown, only links their columns can make."""
+    df = df.copy()
+    cols = set(df.columns)
+
+    if not {'PROJECT', 'SUBJECT'}.issubset(cols):
+        return df
+
+    subj = _link(host, '/data/projects/', df.PROJECT, '/subjects/', df.SUBJECT)
+    df['SUBJECTLINK'] = subj
+
+    if 'SESSION' not in cols:
+        return df
+
+    sess = _link(subj, '/experiments/', df.SESSION)
+    df['SESSIONLINK'] = sess
+
+    if 'ASSR' in cols:
+        has_assr = df.ASSR.notna() & (df.ASSR != '')
+        assr = _link(sess, '/assessors/', df.ASSR, '/out/resources/')
+        df['PDF'] = _link(
+            assr, 'PDF/files/report_', df.ASSR, '.pdf').where(has_assr, '')
+        df['LOG'] = _link(
+            assr, 'OUTLOG/files/', df.ASSR, '.txt').where(has_assr, '')
+
+    if {'SCANID', 'RESOURCES'}.issubset(cols):
+        resources = df.RESOURCES.fillna('').astype(str)
+        scan = _link(sess, '/scans/', df.SCANID, '/resources/')
+        for r in SCAN_RESOURCES:
+            df[r] = _link(scan, r, '/files?format=zip').where(
+                resources.str.contains(r), '')
 
     return df
 
@@ -448,12 +404,23 @@ def filter_data(df, projects, proctypes, scantypes, starttime, endtime, sesstype
         logger.debug(scantypes)
         df = df[(df['SCANTYPE'].isin(scantypes)) | (df['ARTTYPE'] == 'assessor') | (df['ARTTYPE'] == 'sgp')]
 
-    if starttime:
-        logger.debug(f'filtering by start time:{starttime}')
-        df = df[pd.to_datetime(df.DATE) >= starttime]
+    if starttime or endtime:
+        # Older saved data does not have the parsed date
+        if 'DATETIME' in df:
+            dates = df.DATETIME
+        else:
+            dates = pd.to_datetime(df.DATE)
+
+        keep = np.ones(len(df), dtype=bool)
+
+        if starttime:
+            logger.debug(f'filtering by start time:{starttime}')
+            keep &= (dates >= starttime).to_numpy()
+
+        if endtime:
+            keep &= (dates <= endtime).to_numpy()
 
-    if endtime:
-        df = df[pd.to_datetime(df.DATE) <= endtime]
+        df = df[keep]
 
     # Filter by sesstype
     if sesstypes:
@@ -69,6 +69,27 @@ def get_graph_content(df):
     return dbc.Spinner(id="loading-queue-graph", children=[graph])
 
 
+def get_history_content(df):
+    columns = utils.make_columns(df.columns)
+
+    table = dt.DataTable(
+        columns=columns,
+        data=df.to_dict('records'),
+        page_action='none',
+        sort_action='native',
+        id='datatable-queue-history',
+        style_cell={'textAlign': 'center', 'padding': '5px 5px 0px 5px'},
+        style_header={'fontWeight': 'bold'},
+        export_format='xlsx',
+        export_headers='names',
+    )
+
+    return [
+        dbc.Label('Last 30 days, wait and run in hours'),
+        table,
+    ]
+
+
 def get_content():
     COLUMNS = [
         'ID',
@@ -108,6 +129,14 @@ def get_content():
                 ),
                 align='center',
             ),
+            dbc.Col(
+                dbc.Switch(
+                    id='switch-queue-history',
+                    label='History',
+                    value=False,
+                ),
+                align='center',
+            ),
         ]),
         dbc.Row([
             dbc.Col(
@@ -134,6 +163,7 @@ def get_content():
             ),
             dbc.Col(html.Div(id='container-queue-graph', children=[])),
         ]),
+        html.Div(id='container-queue-history', children=[]),
         dbc.Spinner(id="loading-queue-table", children=[
             dbc.Label('Loading...', id='label-queue-rowcount1'),
         ]),
@@ -207,6 +237,7 @@ def filter_data(df, selected_proj, selected_proc, selected_user):
      Output('dropdown-queue-user', 'options'),
      Output('datatable-queue', 'data'),
      Output('container-queue-graph', 'children'),
+     Output('container-queue-history', 'children'),
      Output('label-queue-rowcount1', 'children'),
      Output('label-queue-rowcount2', 'children'),
     ],
@@ -215,6 +246,7 @@ def filter_data(df, selected_proj, selected_proc, selected_user):
      Input('dropdown-queue-proj', 'value'),
      Input('dropdown-queue-user', 'value'),
      Input('switch-queue-graph', 'value'),
+     Input('switch-queue-history', 'value'),
      Input('button-queue-refresh', 'n_clicks'),
     ]
 )
@@ -223,10 +255,12 @@ def update_queue(
     selected_proj,
     selected_user,
     selected_graph,
+    selected_history,
     n_clicks
 ):
     refresh = False
     graph_content = []
+    history_content = []
 
     logger.debug('update_queue')
 
@@ -256,6 +290,12 @@ def update_queue(
     if selected_graph:
         graph_content = get_graph_content(df)
 
+    if selected_history:
+        dfh = data.load_history(selected_proj)
+        if selected_proc:
+            dfh = dfh[dfh.PROCTYPE.isin(selected_proc)]
+        history_content = get_history_content(dfh)
+
     # Get the table data
     records = df.reset_index().to_dict('records')
 
@@ -272,4 +312,13 @@ def update_queue(
     else:
         rowcount = ''
 
-    return [proc, proj, user, records, graph_content, rowcount, rowcount]
+    return [
+        proc,
+        proj,
+        user,
+        records,
+        graph_content,
+        history_content,
+        rowcount,
+        rowcount
+    ]
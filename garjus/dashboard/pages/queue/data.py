@@ -3,8 +3,10 @@ import os
 
 import pandas as pd
 
-from .. import utils
+from .. import utils, store
 from ....garjus import Garjus
+from ..pool import get_garjus
+from ....tasks import history
 
 
 logger = logging.getLogger('dashboard.queue.data')
@@ -24,7 +26,7 @@ def get_filename():
 
 
 def get_data(proj_filter, hidedone=True):
-    g = Garjus()
+    g = get_garjus()
 
     if not g.rcq_enabled():
         logger.debug('rcq not enabled, no data')
@@ -73,6 +75,15 @@ def run_refresh(hidedone=True):
 
 
 def load_data(refresh=False, hidedone=True, maxmins=5):
+    # Shared by pages and users in this process, file is shared by workers
+    return store.get(
+        store.redcap_key(f'queue:{hidedone}'),
+        lambda: _load_file(refresh, hidedone, maxmins),
+        maxmins=maxmins,
+        refresh=refresh)
+
+
+def _load_file(refresh, hidedone, maxmins):
     filename = get_filename()
 
     if not os.path.exists(filename):
@@ -90,6 +101,15 @@ def load_data(refresh=False, hidedone=True, maxmins=5):
     return df
 
 
+def load_history(proj_filter=None, days=30):
+    # Job history is saved locally by queue2dax/dax2queue
+    try:
+        return history.summary(projects=proj_filter, days=days)
+    except Exception as err:
+        logger.debug(f'no job history:{err}')
+        return pd.DataFrame(columns=history.SUMMARY_COLS)
+
+
 def filter_data(df, proj, proc, user):
     # Filter by project
     if proj:
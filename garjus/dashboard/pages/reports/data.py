@@ -3,7 +3,9 @@ import os
 import pandas as pd
 from datetime import datetime
 
+from .. import utils, store
 from ....garjus import Garjus
+from ..pool import get_garjus
 
 
 logger = logging.getLogger('dashboard.reports.data')
@@ -35,7 +37,7 @@ def load_options(df):
     times = ['All', 'Current']
 
     # Projects
-    garjus = Garjus()
+    garjus = get_garjus()
     projects = garjus.projects()
 
     # Selected types
@@ -49,6 +51,15 @@ def load_options(df):
 
 
 def load_data(refresh=False):
+    # Shared by pages and users in this process, file is shared by workers
+    return store.get(
+        store.redcap_key('reports'),
+        lambda: _load_file(refresh),
+        maxmins=None,
+        refresh=refresh)
+
+
+def _load_file(refresh):
     filename = get_filename()
 
     if refresh or not os.path.exists(filename):
@@ -82,11 +93,11 @@ def read_data(filename):
 
 def save_data(df, filename):
     # save to cache
-    df.to_pickle(filename)
+    utils.save_data(df, filename)
 
 
 def get_data():
-    g = Garjus()
+    g = get_garjus()
 
     if not g.redcap_enabled():
         logger.debug('redcap not enabled, no reports data')
@@ -54,3 +54,12 @@ ASTATUS2COLOR = {
     'UNKNOWN': RGB_PURPLE}
 
 GWIDTH = 1000
+
+# How often pages check the age of cached data, in seconds
+FRESHNESS_SECS = 60
+
+# Plots with more points than this draw markers with WebGL
+WEBGL_POINTS = 2000
+
+# Plots with more points than this are summarized or sampled on the server
+MAX_POINTS = 10000
@@ -5,12 +5,12 @@ import numpy as np
 import plotly
 import plotly.graph_objs as go
 import plotly.subplots
-from dash import Input, Output, callback,dcc, html, dash_table as dt
+from dash import Input, Output, State, callback, dcc, html, dash_table as dt
 import dash_bootstrap_components as dbc
 
-from .. import utils
+from .. import utils, table
 from . import data
-from ..shared import GWIDTH
+from ..shared import GWIDTH, FRESHNESS_SECS, WEBGL_POINTS, MAX_POINTS
 
 
 logger = logging.getLogger('dashboard.stats')
@@ -134,6 +134,13 @@ def get_xvar_graph(df, var_list, xvar, pivot=None):
         subplot_titles=var_titles
     )
 
+    # Use WebGL for many points and plot a sample of too many
+    count = len(df)
+    scatter = go.Scattergl if count * len(var_list) > WEBGL_POINTS else go.Scatter
+    df = utils.sample_rows(df, MAX_POINTS)
+    if len(df) < count:
+        fig.update_layout(title_text=f'Sample of {len(df)}/{count}')
+
     # Draw plots by adding traces to figure
     for i, var in enumerate(var_list):
         _row = 1
@@ -148,7 +155,7 @@ def get_xvar_graph(df, var_list, xvar, pivot=None):
             colors_map=dict(zip(df[pivot].unique(), np.linspace(0,1,df[pivot].nunique())))
             marker_colors = df[pivot].map(colors_map)
             fig.append_trace(
-                go.Scatter(
+                scatter(
                     x=_xvalues,
                     y=df[var].astype(str).str.strip('%').astype(float),
                     mode='markers',
@@ -163,7 +170,7 @@ def get_xvar_graph(df, var_list, xvar, pivot=None):
                 _col)
         else:
             fig.append_trace(
-                go.Scatter(
+                scatter(
                     x=_xvalues,
                     y=df[var].astype(str).str.strip('%').astype(float),
                     mode='markers',
@@ -217,6 +224,9 @@ def get_stats_graph(df, var_list, pivot=None):
         horizontal_spacing=hspacing,
         subplot_titles=var_titles)
 
+    # Summarize on the server instead of sending too many points
+    summarize = len(df) * len(var_list) > MAX_POINTS
+
     # Draw boxplots by adding traces to figure
     for i, var in enumerate(var_list):
         _row = 1
@@ -231,16 +241,20 @@ def get_stats_graph(df, var_list, pivot=None):
         else:
             _xvalues = None
 
-        fig.append_trace(
-            go.Box(
-                y=df[var].astype(str).str.strip('%').astype(float),
+        _yvalues = df[var].astype(str).str.strip('%').astype(float)
+
+        if summarize:
+            _box = go.Box(**utils.box_stats(_yvalues, _xvalues), boxmean=True)
+        else:
+            _box = go.Box(
+                y=_yvalues,
                 x=_xvalues,
                 boxpoints='all',
                 text=df['ASSR'],
                 boxmean=True,
-            ),
-            _row,
-            _col)
+            )
+
+        fig.append_trace(_box, _row, _col)
 
         if var.startswith('con_') or var.startswith('inc_'):
             fig.update_yaxes(range=[-1, 1], autorange=False)
@@ -283,6 +297,9 @@ def get_content():
             color='primary',
             size='sm',
         ),
+        html.Div(id='label-stats-freshness'),
+        dcc.Interval(
+            id='interval-stats-freshness', interval=FRESHNESS_SECS * 1000),
         dbc.Spinner(id="loading-stats", children=[
             html.Div(dcc.Tabs(
                 id='tabs-stats',
@@ -358,8 +375,14 @@ def get_content():
         dt.DataTable(
             columns=[],
             data=[],
-            page_action='none',
-            sort_action='native',
+            filter_action='custom',
+            filter_query='',
+            page_current=0,
+            page_size=table.PAGE_SIZE,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='multi',
+            sort_by=[],
             id='datatable-stats',
             style_table={
                 'overflowY': 'scroll',
@@ -392,17 +415,29 @@ def get_content():
             export_columns='visible',
         ),
         dbc.Label('Get ready...', id='label-stats-rowcount2'),
+        dbc.Button(
+            'Download all',
+            id='button-stats-download',
+            outline=True,
+            color='primary',
+            size='sm',
+        ),
+        dcc.Download(id='download-stats'),
+        dcc.Store(id='store-stats-table'),
     ]
 
     return content
 
 
-def load_stats(projects=[], refresh=False, filename=None):
+def load_stats(projects=[], proctypes=[], refresh=False):
 
     if projects is None:
         projects = []
 
-    return data.load_data(projects, refresh=refresh, filename=filename)
+    if proctypes is None:
+        proctypes = []
+
+    return data.load_data(projects, proctypes, refresh=refresh)
 
 
 def _subject_pivot(df):
@@ -480,17 +515,25 @@ def _session_pivot(df):
     return dfp
 
 
+@callback(
+    Output('label-stats-freshness', 'children'),
+    [Input('interval-stats-freshness', 'n_intervals'),
+     Input('dropdown-stats-proj', 'value'),
+     Input('dropdown-stats-proc', 'value')])
+def update_freshness(n_intervals, selected_proj, selected_proc):
+    return utils.freshness_text(data.load_status(selected_proj, selected_proc))
+
+
 @callback(
     [Output('dropdown-stats-proc', 'options'),
      Output('dropdown-stats-proj', 'options'),
      Output('dropdown-stats-sess', 'options'),
      Output('dropdown-stats-meas', 'options'),
      Output('dropdown-stats-xvar', 'options'),
-     Output('datatable-stats', 'data'),
+     Output('store-stats-table', 'data'),
      Output('datatable-stats', 'columns'),
+     Output('datatable-stats', 'page_current'),
      Output('tabs-stats', 'children'),
-     Output('label-stats-rowcount1', 'children'),
-     Output('label-stats-rowcount2', 'children'),
     ],
     [
      Input('dropdown-stats-proc', 'value'),
@@ -521,19 +564,18 @@ def update_stats(
         logger.debug('refresh:clicks={}'.format(n_clicks))
         refresh = True
 
-    # Load selected data with refresh if requested
-    df = load_stats(selected_proj, refresh=refresh)
-
-    if selected_proj and (df.empty or (sorted(selected_proj) != sorted(df.PROJECT.unique()))):
-        # A new project was selected so we force refresh
-        logger.debug('new project selected, refreshing')
-        df = load_stats(selected_proj, refresh=True)
-
     # Get options based on selected projects, only show proc for those projects
     proj_options, proc_options = data.load_options(selected_proj)
 
     logger.debug(f'loaded options:{proj_options}:{proc_options}')
 
+    # Remove from selected what is no longer an option
+    if selected_proc:
+        selected_proc = [x for x in selected_proc if x in proc_options]
+
+    # Load selected types of selected projects, refresh if requested
+    df = load_stats(selected_proj, selected_proc, refresh=refresh)
+
     proj = utils.make_options(proj_options)
     proc = utils.make_options(proc_options)
 
@@ -585,14 +627,6 @@ def update_stats(
     # Get the records and columns for DataTable
     _cols = [x for x in list(df.columns) if x not in ['SESSIONLINK']]
     columns = utils.make_columns(_cols)
-    records = df.reset_index().to_dict('records')
-
-    # Format records
-    for r in records:
-        if 'SESSION' in r and 'SESSIONLINK' in r:
-            _sess = r['SESSION']
-            _link = r['SESSIONLINK']
-            r['SESSION'] = f'[{_sess}]({_link})'
 
     # Format columns
     for i, c in enumerate(columns):
@@ -602,9 +636,72 @@ def update_stats(
         elif _plottable(df[c['name']]):
             columns[i]['type'] = 'numeric'
 
-    # Count how many rows are in the table
-    rowcount = '{} rows'.format(len(records))
+    # Save the table for paging, the browser only gets the key
+    key = table.save('stats', df.reset_index())
 
     # Return table, figure, dropdown options
     logger.debug('update_all:returning data')
-    return [proc, proj, sess, meas, xvar, records, columns, tabs, rowcount, rowcount]
+    return [proc, proj, sess, meas, xvar, {'key': key}, columns, 0, tabs]
+
+
+@callback(
+    [Output('datatable-stats', 'data'),
+     Output('datatable-stats', 'page_count'),
+     Output('label-stats-rowcount1', 'children'),
+     Output('label-stats-rowcount2', 'children'),
+    ],
+    [Input('store-stats-table', 'data'),
+     Input('datatable-stats', 'page_current'),
+     Input('datatable-stats', 'page_size'),
+     Input('datatable-stats', 'sort_by'),
+     Input('datatable-stats', 'filter_query'),
+    ])
+def update_stats_page(stored, page_current, page_size, sort_by, filter_query):
+    if not stored:
+        return [[], 1, 'Get ready...', '']
+
+    dfp, page_count, count = table.get_page(
+        stored['key'], page_current, page_size, sort_by, filter_query)
+
+    if dfp is None:
+        return [[], 1, 'Refresh to reload', '']
+
+    records = dfp.to_dict('records')
+
+    # Format records shown
+    for r in records:
+        if 'SESSION' in r and 'SESSIONLINK' in r:
+            _sess = r['SESSION']
+            _link = r['SESSIONLINK']
+            r['SESSION'] = f'[{_sess}]({_link})'
+
+    # Count how many rows are in the table
+    rowcount = '{} rows'.format(count)
+
+    return [records, page_count, rowcount, rowcount]
+
+
+@callback(
+    Output('download-stats', 'data'),
+    [Input('button-stats-download', 'n_clicks'),
+     State('store-stats-table', 'data'),
+     State('datatable-stats', 'sort_by'),
+     State('datatable-stats', 'filter_query'),
+     State('datatable-stats', 'columns'),
+     ],
+    prevent_initial_call=True)
+def download_stats(n_clicks, stored, sort_by, filter_query, columns):
+    # The xlsx export only has the current page, this has all rows
+    if not stored or 'key' not in stored:
+        return None
+
+    df = table.export(
+        stored['key'],
+        sort_by,
+        filter_query,
+        [x['id'] for x in columns or []])
+
+    if df is None:
+        return None
+
+    return dcc.send_data_frame(df.to_csv, 'stats.csv', index=False)
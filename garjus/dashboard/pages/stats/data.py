@@ -1,39 +1,20 @@
 import logging
-import os
 from datetime import datetime
+from functools import partial
+
 import pandas as pd
 
-from ....garjus import Garjus
+from ..pool import get_garjus
+from ..cache import ProjectCache
 
 
 logger = logging.getLogger('dashboard.stats.data')
 
 
-def get_filename():
-    datadir = f'{Garjus.userdir()}/DATA'
-    filename = f'{datadir}/statsdata.pkl'
-
-    try:
-        os.makedirs(datadir)
-    except FileExistsError:
-        pass
-
-    return filename
-
-
-def run_refresh(filename, projects):
-    # force a requery
-    df = get_data(projects)
-
-    save_data(df, filename)
-
-    return df
-
-
 def load_options(selected_proj=None):
 
     try:
-        garjus = Garjus()
+        garjus = get_garjus()
 
         if not garjus.redcap_enabled():
             return [], []
@@ -53,44 +34,58 @@ def load_options(selected_proj=None):
         return [], []
 
 
-def load_data(projects, refresh=False, filename=None):
-    if not filename:
-        filename = get_filename()
+def _cache(proctype):
+    # Partition per project in a cache per proctype
+    return ProjectCache(
+        f'stats/{proctype}', partial(get_data, proctypes=[proctype]))
 
-    if refresh or not os.path.exists(filename):
-        # TODO: check for old file and refresh too
-        run_refresh(filename, projects)
 
-    logger.info('reading data from file:{}'.format(filename))
-    return read_data(filename)
+def load_data(projects, proctypes, refresh=False):
+    """Stats of the selected proctypes only, loading those not cached."""
+    frames = [_cache(x).load(projects, refresh=refresh) for x in sorted(proctypes)]
+    frames = [x for x in frames if not x.empty]
 
+    if not frames:
+        return pd.DataFrame()
 
-def read_data(filename):
-    df = pd.read_pickle(filename)
-    return df
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_status(projects, proctypes):
+    ages = []
+    refreshing = False
 
+    for x in proctypes or []:
+        status = _cache(x).status(projects or [])
+        if status['age'] is not None:
+            ages.append(status['age'])
 
-def save_data(df, filename):
-    # save to cache
-    df.to_pickle(filename)
+        refreshing = refreshing or status['refreshing']
 
+    return {'age': max(ages) if ages else None, 'refreshing': refreshing}
 
-def get_data(projects):
+
+def get_data(projects, proctypes=None):
     df = pd.DataFrame()
-    garjus = Garjus()
+    garjus = get_garjus()
 
     if not projects:
         return df
 
     # Concat project stats list of stats
-    assessors = garjus.assessors(projects)
-    assessors = pd.concat([assessors, garjus.subject_assessors(projects=projects)])
+    assessors = garjus.assessors(projects, proctypes=proctypes)
+    assessors = pd.concat([
+        assessors,
+        garjus.subject_assessors(projects=projects, proctypes=proctypes)])
 
     for p in sorted(projects):
         # Load stats
-        stats = garjus.stats(p, assessors)
+        stats = garjus.stats(p, assessors, proctypes=proctypes)
         df = pd.concat([df, stats])
 
+    if df.empty:
+        return df
+
     # Apply tweaks
     if 'SESSTYPE' in df.columns:
         df['SESSTYPE'] = df['SESSTYPE'].fillna('UNKNOWN')
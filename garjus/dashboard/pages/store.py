@@ -0,0 +1,92 @@
+"""Data shared by the pages of this process, loaded once per key.
+
+Each entry has a version that goes up every time it is loaded. Callbacks
+asking for an entry that is being loaded wait for that load instead of
+exporting the same data again. Entries older than maxmins are loaded
+again when next asked for.
+
+Data only from REDCap is the same for every user with the same REDCap
+access, so it is shared between users with redcap_key().
+"""
+import logging
+import threading
+import time
+
+from ...garjus import Garjus
+from .pool import get_garjus
+from .. import metrics
+
+
+logger = logging.getLogger('dashboard.store')
+
+
+class _Entry:
+    def __init__(self):
+        # Held while loading
+        self.lock = threading.Lock()
+        self.value = None
+        self.version = 0
+        self.loaded = None
+
+    def fresh(self, maxmins):
+        if self.loaded is None:
+            return False
+
+        return maxmins is None or (time.time() - self.loaded) / 60 <= maxmins
+
+
+_entries = {}
+_entries_lock = threading.Lock()
+
+
+def _copy(value):
+    # Callers may change their data, keep ours as loaded
+    return value.copy() if hasattr(value, 'copy') else value
+
+
+def _entry(key):
+    with _entries_lock:
+        return _entries.setdefault(key, _Entry())
+
+
+def user_key(name):
+    """Key for data of the current user."""
+    return (name, Garjus.userdir())
+
+
+def redcap_key(name):
+    """Key for data only from REDCap, shared by users with same access."""
+    g = get_garjus()
+    return (name, g.redcap_enabled(), g.rcq_enabled())
+
+
+def get(key, load, maxmins=5, refresh=False):
+    """Copy of the data of key, calling load() if missing or old.
+
+    With refresh, data is loaded again unless another load of the key
+    finished while waiting. maxmins of None never expires.
+    """
+    entry = _entry(key)
+    asked = time.time()
+
+    if not refresh and entry.fresh(maxmins):
+        metrics.count_cache(f'store.{key[0]}', True)
+        return _copy(entry.value)
+
+    with entry.lock:
+        if entry.loaded is not None and entry.loaded >= asked:
+            logger.debug(f'loaded while waiting:{key}')
+            metrics.count_cache(f'store.{key[0]}', True)
+        elif refresh or not entry.fresh(maxmins):
+            logger.debug(f'loading:{key}')
+            metrics.count_cache(f'store.{key[0]}', False)
+            entry.value = load()
+            entry.version += 1
+            entry.loaded = time.time()
+
+        return _copy(entry.value)
+
+
+def version(key):
+    """Number of times key was loaded, 0 if never."""
+    return _entry(key).version
@@ -0,0 +1,260 @@
+"""Server-side paging, sorting and filtering for dashboard tables.
+
+A page callback builds the full table once and saves it with save(), the
+browser gets the key. Tables with page_action, sort_action and
+filter_action set to custom then ask for one page at a time with
+get_page(), so only the rows shown are sent to the browser.
+
+Tables are kept in memory by the worker that built them and also saved
+under the user directory so other workers can serve pages too. The key is
+made from the table contents, so building the same table again reuses the
+saved file.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+from ...garjus import Garjus
+from .. import metrics
+
+
+logger = logging.getLogger('dashboard.table')
+
+
+PAGE_SIZE = 100
+
+# Tables kept in memory by this process
+MAX_TABLES = 16
+
+# Saved tables older than this are removed
+MAX_TABLE_MINS = 24 * 60
+
+# Most saved tables kept per user, oldest removed first
+MAX_TABLE_FILES = 64
+
+# Operators in DataTable filter queries, longest first for matching
+OPERATORS = [
+    ('>=', 'ge'),
+    ('<=', 'le'),
+    ('<', 'lt'),
+    ('>', 'gt'),
+    ('!=', 'ne'),
+    ('=', 'eq'),
+    ('contains', 'contains'),
+    ('datestartswith', 'datestartswith'),
+]
+
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def _tabledir():
+    tabledir = f'{Garjus.userdir()}/DATA/tables'
+    os.makedirs(tabledir, exist_ok=True)
+    return tabledir
+
+
+def _remove_old(tabledir):
+    now = time.time()
+    files = []
+    for f in os.listdir(tabledir):
+        filename = os.path.join(tabledir, f)
+        try:
+            mtime = os.path.getmtime(filename)
+            if (now - mtime) / 60 > MAX_TABLE_MINS:
+                os.remove(filename)
+            else:
+                files.append((mtime, filename))
+        except OSError:
+            # Already removed by another worker
+            pass
+
+    for _, filename in sorted(files)[:-MAX_TABLE_FILES]:
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+
+def _content_key(name, df):
+    # Same table, same key, new key if it cannot be hashed
+    try:
+        values = pd.util.hash_pandas_object(df, index=False).values
+        columns = pd.util.hash_array(df.columns.astype(str).values)
+        digest = hashlib.sha1(values.tobytes() + columns.tobytes())
+        return f'{name}-{digest.hexdigest()}'
+    except Exception as err:
+        logger.debug(f'cannot hash table:{err}')
+        return f'{name}-{uuid.uuid4().hex}'
+
+
+def _remember(key, df):
+    with _tables_lock:
+        _tables[key] = df
+        _tables.move_to_end(key)
+        while len(_tables) > MAX_TABLES:
+            _tables.popitem(last=False)
+
+
+def save(name, df):
+    """Save full table for paging, returns key to load it."""
+    df = df.reset_index(drop=True)
+    key = _content_key(name, df)
+
+    _remember(key, df)
+
+    tabledir = _tabledir()
+    filename = os.path.join(tabledir, f'{key}.pkl')
+    if os.path.exists(filename):
+        # Already saved, keep it from being removed as old
+        os.utime(filename)
+    else:
+        tmpfile = f'{filename}.{os.getpid()}.tmp'
+        df.to_pickle(tmpfile)
+        os.replace(tmpfile, filename)
+
+    _remove_old(tabledir)
+
+    return key
+
+
+def load(key):
+    """Load a saved table, None if not found."""
+    if not key:
+        return None
+
+    with _tables_lock:
+        if key in _tables:
+            _tables.move_to_end(key)
+            metrics.count_cache('table', True)
+            return _tables[key]
+
+    metrics.count_cache('table', False)
+
+    filename = os.path.join(_tabledir(), f'{os.path.basename(key)}.pkl')
+    if not os.path.exists(filename):
+        logger.debug(f'table not found:{key}')
+        return None
+
+    df = pd.read_pickle(filename)
+    _remember(key, df)
+
+    return df
+
+
+def split_filter_part(filter_part):
+    """Split one part of a filter query to column, operator and value."""
+    for symbol, operator in OPERATORS:
+        for text in [f' {symbol} ', f' {operator} ']:
+            if text not in filter_part:
+                continue
+
+            name_part, value = filter_part.split(text, 1)
+            name = name_part[name_part.find('{') + 1:name_part.rfind('}')]
+            value = value.strip()
+            if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"`':
+                value = value[1:-1].replace('\\' + value[0], value[0])
+
+            return name, operator, value
+
+    return None, None, None
+
+
+def _match(values, operator, value):
+    if operator == 'contains':
+        return values.astype(str).str.contains(value, regex=False, na=False)
+
+    if operator == 'datestartswith':
+        return values.astype(str).str.startswith(value, na=False)
+
+    if pd.api.types.is_numeric_dtype(values):
+        try:
+            value = float(value)
+        except ValueError:
+            return pd.Series(False, index=values.index)
+    else:
+        values = values.astype(str)
+
+    return getattr(values, operator)(value).fillna(False)
+
+
+def filter_table(df, filter_query):
+    """Apply a DataTable filter query to the table."""
+    if not filter_query:
+        return df
+
+    for part in filter_query.split(' && '):
+        name, operator, value = split_filter_part(part)
+        if name not in df.columns:
+            logger.debug(f'ignoring filter:{part}')
+            continue
+
+        df = df[_match(df[name], operator, value)]
+
+    return df
+
+
+def sort_table(df, sort_by):
+    """Apply DataTable sort_by to the table, empty values last."""
+    if not sort_by:
+        return df
+
+    sort_by = [x for x in sort_by if x['column_id'] in df.columns]
+    if not sort_by:
+        return df
+
+    by = [x['column_id'] for x in sort_by]
+    ascending = [x['direction'] == 'asc' for x in sort_by]
+
+    try:
+        return df.sort_values(by, ascending=ascending, na_position='last')
+    except TypeError:
+        # Mixed types, sort as text
+        return df.sort_values(
+            by,
+            ascending=ascending,
+            na_position='last',
+            key=lambda x: x.astype(str))
+
+
+def get_page(key, page_current, page_size, sort_by, filter_query):
+    """Page of saved table, returns page, page count and row count.
+
+    The page is a frame of the rows shown, None if table not found.
+    """
+    df = load(key)
+    if df is None:
+        return None, 1, 0
+
+    df = filter_table(df, filter_query)
+    df = sort_table(df, sort_by)
+
+    page_current = page_current or 0
+    page_size = page_size or PAGE_SIZE
+    page_count = max(1, -(-len(df) // page_size))
+    start = page_current * page_size
+
+    return df.iloc[start:start + page_size], page_count, len(df)
+
+
+def export(key, sort_by, filter_query, columns=None):
+    """Full saved table with sort and filter applied, None if not found.
+
+    Only columns are included if given, e.g. the columns shown.
+    """
+    df = load(key)
+    if df is None:
+        return None
+
+    df = sort_table(filter_table(df, filter_query), sort_by)
+
+    if columns:
+        df = df[[x for x in columns if x in df.columns]]
+
+    return df
@@ -19,7 +19,10 @@ def read_data(filename):
 
 
 def save_data(df, filename):
-    df.to_pickle(filename)
+    # Write a temporary file and rename so readers never see partial data
+    tmpfile = f'{filename}.{os.getpid()}.tmp'
+    df.to_pickle(tmpfile)
+    os.replace(tmpfile, filename)
 
 
 def was_triggered(button_id):
@@ -32,3 +35,53 @@ def was_triggered(button_id):
 
 def file_age(filename):
     return int((time.time() - os.path.getmtime(filename)) / 60)
+
+
+def freshness_text(status):
+    """Describe age of cached data, status from ProjectCache.status."""
+    if status['age'] is None:
+        return ''
+
+    text = f'Updated {status["age"]} min ago'
+    if status['refreshing']:
+        text += ', refreshing...'
+
+    return text
+
+
+def sample_rows(df, max_rows):
+    """Random sample of max_rows rows, the same sample every time."""
+    if len(df) <= max_rows:
+        return df
+
+    return df.sample(n=max_rows, random_state=0).sort_index()
+
+
+def box_stats(values, groups=None):
+    """Precomputed box plot arguments for go.Box, per group if given.
+
+    Whiskers reach the furthest values within 1.5 IQR like plotly does.
+    """
+    df = pd.DataFrame({'y': values.to_numpy()})
+    df['x'] = groups.to_numpy() if groups is not None else ''
+    df = df.dropna(subset=['y'])
+
+    stats = {
+        'x': [], 'q1': [], 'median': [], 'q3': [],
+        'lowerfence': [], 'upperfence': [], 'mean': []}
+
+    for name, g in df.groupby('x', sort=True, observed=True):
+        q1, median, q3 = g.y.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        stats['x'].append(name)
+        stats['q1'].append(q1)
+        stats['median'].append(median)
+        stats['q3'].append(q3)
+        stats['lowerfence'].append(g.y[g.y >= q1 - 1.5 * iqr].min())
+        stats['upperfence'].append(g.y[g.y <= q3 + 1.5 * iqr].max())
+        stats['mean'].append(g.y.mean())
+
+    if groups is None:
+        del stats['x']
+
+    return stats
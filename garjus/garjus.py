@@ -5,6 +5,8 @@ Anything outside this class should refer to scans, assessors, issues, etc.
 
 """
 import pathlib
+import io
+import zipfile
 import logging
 import json
 from datetime import datetime, date
@@ -12,8 +14,10 @@ import glob
 import os
 import tempfile
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import yaml
 
+import numpy as np
 import pandas as pd
 from redcap import Project, RedcapError
 from pyxnat import Interface
@@ -30,6 +34,7 @@ from .progress import update as update_progress
 from .progress import make_project_report, make_stats_csv, make_export_zip, make_statshot, make_anonshot
 from .compare import make_double_report, update as update_compare
 from .stats import update as update_stats
+from .stats import archive as stats_archive
 from .automations import update as update_automations
 from .image03 import update as update_image03, download as download_image03
 from .issues import update as update_issues
@@ -48,6 +53,17 @@ from .anonymize import anonymize_project, check_project
 logger = logging.getLogger('garjus')
 
 
+# Concurrent XNAT requests and REDCap records per import when retrying
+RETRY_WORKERS = 8
+RETRY_CHUNK = 100
+
+
+# Stats fields exported
+STATS_FIELDS = ['stats_assr', 'stats_name', 'stats_value']
+
+# Most assessors listed in a stats export filter, more exports by proctype
+STATS_FILTER_MAX = 500
+
 DISABLED_STATS = ['fmri_rest_v4', 'fmri_rest_v5', 'struct_preproc_noflair_v1', 'francois_schaefer200_v1', 'francois_schaefer400_v1']
 
 
@@ -748,55 +764,20 @@ class Garjus:
             yaml_dir,
             repeat_id=task_id)
 
-    def set_task_statuses(self, tasks):
-        records = []
-        def_field = self._rcq.def_field
+    def task_status_updater(self, chunk_size=500):
+        """Return updater that coalesces task status updates into chunks."""
+        from .tasks.status import StatusUpdater
+        return StatusUpdater(self._rcq, chunk_size=chunk_size)
 
-        # Build list of task updates as records with updated values
-        for i, t in tasks.iterrows():
-            r = {
-                def_field: t['PROJECT'],
-                'redcap_repeat_instance': t['ID'],
-                'redcap_repeat_instrument': 'taskqueue',
-                'task_status': t['STATUS']
-            }
-            if t['STATUS'] == 'COMPLETE':
-                # Set the redcap complete indicator too
-                r['taskqueue_complete'] = '2'
-
-            # TODO: get the job id here too
-
-            records.append(r)
-
-        # Apply the updates in one call
-        try:
-            response = self._rcq.import_records(records)
-            assert 'count' in response
-            logger.debug('task status records updated')
-        except AssertionError as err:
-            logger.error(f'failed to set task statuses:{err}')
+    def set_task_statuses(self, tasks):
+        # Apply the updates in as few calls as possible
+        with self.task_status_updater() as updater:
+            for t in tasks.to_dict('records'):
+                updater.add(t['PROJECT'], t['ID'], t['STATUS'])
 
     def set_task_status(self, project, task_id, status):
-        def_field = self._rcq.def_field
-
-        record = {
-            def_field: project,
-            'redcap_repeat_instance': task_id,
-            'redcap_repeat_instrument': 'taskqueue',
-            'task_status': status,
-        }
-
-        if status == 'COMPLETE':
-            record['taskqueue_complete'] = '2'
-        elif status == 'JOB_FAILED':
-            record['taskqueue_complete'] = '0'
-
-        try:
-            response = self._rcq.import_records([record])
-            assert 'count' in response
-            logger.debug('task status updated')
-        except AssertionError as err:
-            logger.error(f'failed to set task status:{err}')
+        with self.task_status_updater() as updater:
+            updater.add(project, task_id, status)
 
     def delete_old_issues(self, projects=None, days=7):
         old_issues = []
@@ -1208,6 +1189,8 @@ class Garjus:
 
         logger.info(f'set from {oldstatus} to {newstatus}:{len(df)}')
 
+        updater = self.task_status_updater()
+
         # Set statuses
         for i, t in df.iterrows():
             assr = t['ASSESSOR']
@@ -1234,7 +1217,10 @@ class Garjus:
 
             task_id = t['ID']
             logger.info(f'setting REDCap attributes:{project}:{task_id}:{newstatus}')
-            self.set_task_status(project, task_id, newstatus)
+            updater.add(project, task_id, newstatus)
+
+        updater.flush()
+        logger.debug(f'task status metrics:{updater.metrics()}')
 
     def analyses(self, projects=None, download=True):
         """Return analyses."""
@@ -1368,51 +1354,66 @@ class Garjus:
         assessors=None,
         proctypes=None,
         sesstypes=None,
-        persubject=False
+        persubject=False,
+        subjects=None,
+        sessions=None,
+        startdate=None,
+        enddate=None,
     ):
-        """Return all stats for project, filtered by proctypes."""
+        """Return all stats for project, filtered by proctypes.
+
+        Filters by subjects, sessions or dates are applied to the assessors
+        first and only the stats of matching assessors are exported.
+        """
 
         if not self.redcap_enabled():
             logger.info('cannot load stats, redcap not enabled')
             return None
 
-        try:
-            """Get the stats data from REDCap."""
-            statsrc = self._stats_redcap(project)
-            rec = statsrc.export_records(forms=['stats'])
-
-        except:
-            return pd.DataFrame(columns=['ASSR', 'PROCTYPE', 'SESSTYPE'])
+        if assessors is None:
+            assessors = self.assessors(projects=[project], proctypes=proctypes)
+            assessors = pd.concat([assessors, self.subject_assessors(projects=[project], proctypes=proctypes)])
 
-        # Filter out FS6 if found, old
-        rec = [x for x in rec if 'FS6_v1' not in x['stats_assr']]
+        # Filter out failed
+        logger.debug(f'filtering out Failed assessors')
+        assessors = assessors[~assessors.QCSTATUS.isin(['Failed'])]
 
-        # Filter out old FS7 if found
-        rec = [x for x in rec if not x['stats_name'].startswith('fs7_')]
+        assessors = _filter_assessors(
+            assessors, proctypes, sesstypes, subjects, sessions, startdate, enddate)
 
-        # Make a dataframe of columns we need
-        df = pd.DataFrame(
-            rec,
-            columns=['stats_assr', 'stats_name', 'stats_value'])
+        labels = None
+        if subjects or sessions or startdate or enddate:
+            labels = sorted(assessors.ASSR.unique())
+            if not labels:
+                return pd.DataFrame(columns=['ASSR', 'PROCTYPE', 'SESSTYPE'])
 
-        df = df.drop_duplicates(subset=['stats_assr', 'stats_name'])
+        rec = None
+        if stats_archive.exists(project, self._cachedir):
+            try:
+                logger.debug(f'loading stats from archive:{project}')
+                rec = stats_archive.load(project, self._cachedir, proctypes)
+                if labels:
+                    rec = rec[rec.stats_assr.isin(labels)]
+            except Exception as err:
+                logger.warning(f'cannot read stats archive, using REDCap:{err}')
 
-        # Pivot to row per assessor, col per stats_name, values as stats_value
-        df = pd.pivot(
-            df,
-            index='stats_assr',
-            values='stats_value',
-            columns='stats_name')
+        if rec is None:
+            if labels and len(labels) <= STATS_FILTER_MAX:
+                filter_logic = stats_archive.assessor_filter(labels)
+            else:
+                filter_logic = _proctype_filter(proctypes)
 
-        df = df.reset_index()
+            try:
+                """Get the stats data from REDCap."""
+                statsrc = self._stats_redcap(project)
+                rec = statsrc.export_records(
+                    fields=STATS_FIELDS, filter_logic=filter_logic)
 
-        if assessors is None:
-            assessors = self.assessors(projects=[project], proctypes=proctypes)
-            assessors = pd.concat([assessors, self.subject_assessors(projects=[project], proctypes=proctypes)])
+            except:
+                return pd.DataFrame(columns=['ASSR', 'PROCTYPE', 'SESSTYPE'])
 
-        # Filter out failed
-        logger.debug(f'filtering out Failed assessors')
-        assessors = assessors[~assessors.QCSTATUS.isin(['Failed'])]
+        # Pivot to row per assessor, col per stats_name, numeric when possible
+        df = _stats_pivot(pd.DataFrame(rec, columns=STATS_FIELDS))
 
         # Merge with assessors
         df = pd.merge(
@@ -1427,13 +1428,6 @@ class Garjus:
 
         df = df.sort_values('ASSR')
 
-        # Apply filters
-        if proctypes:
-            df = df[df.PROCTYPE.isin(proctypes)]
-
-        if sesstypes:
-            df = df[df.SESSTYPE.isin(sesstypes)]
-
         if persubject:
             logger.debug(f'pivot to row per subject')
 
@@ -1446,6 +1440,11 @@ class Garjus:
         return df
 
 
+    def sync_stats_archive(self, project, full=False):
+        """Update local stats archive of project from the stats REDCap."""
+        return stats_archive.sync(
+            self._stats_redcap(project), project, self._cachedir, full=full)
+
     def stats_assessors(self, project, proctypes=None):
         """Get list of assessors already in stats archive."""
 
@@ -2545,6 +2544,38 @@ class Garjus:
 
         return f'{stats_dir}/STATS'
 
+    def get_sgp_source_stats_files(self, project, subject, assessor):
+        """List files in STATS resource of subject assessor."""
+        return self._resource_files(
+            f'/data/projects/{project}/subjects/{subject}/experiments/{assessor}/resources/STATS')
+
+    def get_source_stats_files(self, project, subject, session, assessor):
+        """List files in STATS resource of assessor."""
+        return self._resource_files(
+            f'/data/projects/{project}/subjects/{subject}/experiments/{session}/assessors/{assessor}/out/resources/STATS')
+
+    def _resource_files(self, uri):
+        """List of files at top level of resource with Name, Size, URI."""
+        files = self._get_result(f'{uri}/files?format=json')
+
+        # Subfolders are not extracted to the top level
+        files = [x for x in files if x['URI'].endswith(f'/files/{x["Name"]}')]
+
+        return [{
+            'Name': x['Name'],
+            'Size': int(x.get('Size') or 0),
+            'URI': x['URI'],
+        } for x in files]
+
+    def get_resource_text(self, uri):
+        """Download a file from xnat and return contents as text."""
+        if not self.xnat_enabled():
+            raise Exception('xnat not enabled')
+
+        response = self._xnat.get(uri)
+        response.raise_for_status()
+        return response.text
+
     def get_source_stats(self, project, subject, session, assessor, stats_dir):
         """Download stats files to directory."""
         if not self.xnat_enabled():
@@ -2594,51 +2625,59 @@ class Garjus:
 
         return stats
 
-    def set_stats(self, project, subject, session, assessor, data):
-        """Upload stats to redcap."""
+    def get_session_scan_stats(self, project, subject, session, scans):
+        """Read BIDS files of scans in session from one zip download.
 
-        if 'Multi_Atlas_v3' in assessor:
-            data = {k: data.get(k, '') for k in ['ticv_mm3']}
+        Returns dict of scan ID to stats, scans without exactly one JSON
+        file are not included.
+        """
+        if not self.xnat_enabled():
+            raise Exception('xnat not enabled')
 
-        if len(data.keys()) > self.max_stats:
-            logger.debug('found too many, specify subset')
-            return
+        uri = (
+            f'/data/projects/{project}/subjects/{subject}/experiments/{session}'
+            f'/scans/{",".join(scans)}/resources/JSON/files?format=zip')
 
-        # Create list of stat records
-        rec = [{'stats_name': k, 'stats_value': v} for k, v in data.items()]
+        response = self._xnat.get(uri)
+        response.raise_for_status()
 
-        # Build out the records
-        for r in rec:
-            r['subject_id'] = subject
-            r['stats_assr'] = assessor
-            r['redcap_repeat_instrument'] = 'stats'
-            r['redcap_repeat_instance'] = 'new'
-            r['stats_complete'] = 2
+        # Group json files by scan, the scan folder is named ID-TYPE
+        found = {}
+        with zipfile.ZipFile(io.BytesIO(response.content)) as z:
+            for name in z.namelist():
+                if not name.endswith('.json'):
+                    continue
 
-        # Now upload
-        logger.debug(f'uploading to redcap:{project}')
-        statsrc = self._stats_redcap(project)
-        logger.debug(f'{statsrc=}')
+                parts = name.split('/')
+                if 'scans' not in parts:
+                    continue
 
-        try:
-            logger.debug('importing records')
-            response = statsrc.import_records(rec)
-            assert 'count' in response
-            logger.debug('stats record created')
-        except AssertionError as err:
-            logger.error(f'upload failed:{err}')
-        except ConnectionError as err:
-            logger.error(err)
-            logger.info('wait a minute')
-            import time
-            time.sleep(60)
+                folder = parts[parts.index('scans') + 1]
+                scan = max(
+                    (x for x in scans if folder == x or folder.startswith(f'{x}-')),
+                    key=len,
+                    default=None)
+                if scan is not None:
+                    found.setdefault(scan, []).append(z.read(name))
 
-    def set_sgp_stats(self, project, subject, assessor, data):
-        """Upload stats to redcap."""
+        stats = {}
+        for scan, files in found.items():
+            if len(files) > 1:
+                logging.debug(f'too many JSON files found:{session}:{scan}')
+                continue
+
+            stats[scan] = self._bids_data(json.loads(files[0], strict=False))
+
+        return stats
+
+    def stats_records(self, subject, assessor, data):
+        """Stats as records for the stats REDCap, None if too many."""
+        if 'Multi_Atlas_v3' in assessor:
+            data = {k: data.get(k, '') for k in ['ticv_mm3']}
 
         if len(data.keys()) > self.max_stats:
             logger.debug('found too many, specify subset')
-            return
+            return None
 
         # Create list of stat records
         rec = [{'stats_name': k, 'stats_value': v} for k, v in data.items()]
@@ -2651,29 +2690,44 @@ class Garjus:
             r['redcap_repeat_instance'] = 'new'
             r['stats_complete'] = 2
 
-        # Now upload
+        return rec
+
+    def stats_batch(self, project, chunk_size=1000, on_import=None):
+        """Return batch that imports stats records of many assessors."""
+        return utils_redcap.RecordBatch(
+            self._stats_redcap(project),
+            chunk_size=chunk_size,
+            on_import=on_import)
+
+    def _import_stats(self, project, rec):
         logger.debug(f'uploading to redcap:{project}')
         statsrc = self._stats_redcap(project)
         logger.debug(f'{statsrc=}')
 
         try:
             logger.debug('importing records')
-            response = statsrc.import_records(rec)
-            assert 'count' in response
+            utils_redcap.import_records_retry(statsrc, rec)
             logger.debug('stats record created')
         except AssertionError as err:
             logger.error(f'upload failed:{err}')
-        except ConnectionError as err:
-            logger.error(err)
-            logger.info('wait a minute')
-            import time
-            time.sleep(60)
+        except utils_redcap.RETRY_ERRORS as err:
+            logger.error(f'upload failed after retries:{err}')
 
+    def set_stats(self, project, subject, session, assessor, data):
+        """Upload stats to redcap."""
+        rec = self.stats_records(subject, assessor, data)
+        if rec:
+            self._import_stats(project, rec)
 
-    def set_scan_stats(self, project, subject, session, scan, data):
-        """Upload to redcap."""
+    def set_sgp_stats(self, project, subject, assessor, data):
+        """Upload stats to redcap."""
+        rec = self.stats_records(subject, assessor, data)
+        if rec:
+            self._import_stats(project, rec)
 
-        rec = {
+    def scan_stats_record(self, subject, session, scan, data):
+        """Scan stats as a record for the stats REDCap."""
+        return {
             'subject_id': subject,
             'scan_session': session,
             'scan_id': scan,
@@ -2687,19 +2741,26 @@ class Garjus:
             'scan_slicethickness':data['thickness']
         }
 
+    def set_scan_stats(self, project, subject, session, scan, data):
+        """Upload to redcap."""
+        rec = self.scan_stats_record(subject, session, scan, data)
+        self._import_scan_stats(project, [rec])
+
+    def set_session_scan_stats(self, project, subject, session, stats):
+        """Upload stats of many scans in session, dict of scan to stats."""
+        rec = [self.scan_stats_record(subject, session, k, v) for k, v in stats.items()]
+        self._import_scan_stats(project, rec)
+
+    def _import_scan_stats(self, project, rec):
         # Now upload
         try:
             logger.debug('uploading to redcap')
-            response = self._stats_redcap(project).import_records([rec])
-            assert 'count' in response
-            logger.debug('scan record uploaded')
+            utils_redcap.import_records_retry(self._stats_redcap(project), rec)
+            logger.debug(f'scan records uploaded:{len(rec)}')
         except AssertionError as err:
             logger.error(f'upload failed:{err}')
-        except ConnectionError as err:
-            logger.error(err)
-            logger.info('wait a minute')
-            import time
-            time.sleep(60)
+        except utils_redcap.RETRY_ERRORS as err:
+            logger.error(f'upload failed after retries:{err}')
 
     def project_setting(self, project, setting):
         """Return the value of the setting for this project."""
@@ -3164,6 +3225,9 @@ class Garjus:
         with open(jsonfile) as f:
             data = json.load(f, strict=False)
 
+        return self._bids_data(data)
+
+    def _bids_data(self, data):
         return {
             'modality': data.get('Modality', ''),
             'date': data.get('AcquisitionDateTime', ''),
@@ -3522,6 +3586,16 @@ class Garjus:
         from .tasks import dax2garjus
         dax2garjus.dax2queue(self)
 
+    def job_history(self, projects=None, days=None):
+        """Task status transitions saved by queue2dax/dax2queue."""
+        from .tasks import history
+        return history.load(projects, days, cachedir=self.cachedir())
+
+    def job_stats(self, projects=None, days=30):
+        """Throughput, queue wait and runtime per proctype from history."""
+        from .tasks import history
+        return history.summary(projects, days, cachedir=self.cachedir())
+
     # Check for duplicate build
     def detect_duplicate(self, project_data):
         detected = False
@@ -3546,29 +3620,54 @@ class Garjus:
 
         return detected
 
-    def retry(self, project, proctype=None):
+    def retry(self, project, proctype=None, dry_run=False):
         '''Delete outputs on xnat, set to job running, reset on redcap'''
+        plan = self._retry_plan(project, proctype)
+
+        if plan.empty:
+            logger.info('no failed tasks found')
+            return plan
+
+        for a in plan.to_dict('records'):
+            if a['CLEAR']:
+                _res = ','.join(a['RESOURCES']) or 'none'
+                logger.info(f'retry:{a["ASSR"]}:delete resources:{_res}')
+            else:
+                logger.info(f'retry:{a["ASSR"]}:already cleared')
+
+        if dry_run:
+            logger.info(f'dry run, not applying:{len(plan)} assessors')
+            return plan
+
+        self._retry_apply(project, plan)
+
+        return plan
+
+    def _retry_plan(self, project, proctype=None):
+        '''Determine which assessors to reset from cached tables.'''
         SKIP_LIST = ['OLD', 'EDITS']
-        records = []
-        def_field = self._rcq.def_field
+        plan = []
 
         # get tasks with status of fail, failcount blank or 0
-        df = self.tasks(hidedone=False)
+        df = self.tasks(hidedone=False, projects=[project])
         df = df[df.PROJECT == project]
         failed_tasks = df[(df.STATUS == 'JOB_FAILED') & (df.FAILCOUNT == '')]
 
-        if len(failed_tasks) == 0:
-            logger.info('no failed tasks found')
-            return
+        if failed_tasks.empty:
+            return pd.DataFrame(plan)
 
-        logger.debug(f'deleting files from failed tasks:{len(failed_tasks)}')
+        # Load assessors and their resources with one query per type
+        dfa = pd.concat([
+            self.assessors(projects=[project]),
+            self.subject_assessors(projects=[project])])
+        assessors = {x['ASSR']: x for x in dfa.to_dict('records')}
 
-        dfa = self.assessors(projects=[project])
-        dfs = self.subject_assessors(projects=[project])
+        resources = self.assessor_resources(project, '')
+        resources.update(self.subject_assessor_resources(project))
 
-        for i, t in failed_tasks.iterrows():
+        for t in failed_tasks.to_dict('records'):
             assr = t['ASSESSOR']
-            is_sgp = is_sgp_assessor(t['ASSESSOR'])
+            is_sgp = is_sgp_assessor(assr)
 
             if proctype:
                 if is_sgp:
@@ -3578,108 +3677,105 @@ class Garjus:
                     if assr.split('-x-')[3] != proctype:
                         continue
 
-            # Connect to the assessor on xnat
-            if is_sgp:
-                xsitype = 'proc:subjgenprocdata'
-                _subj = assr.split('-x-')[1]
-                assessor = self.xnat().select(f'/projects/{project}/subjects/{_subj}/experiment/{assr}')
-            else:
-                xsitype = 'proc:genprocdata'
-                assessor = self.xnat().select_assessor(
-                    project,
-                    assr.split('-x-')[1],
-                    assr.split('-x-')[2],
-                    assr)
-
-            if not assessor.exists():
+            if assr not in assessors:
                 logger.debug(f'assessor not found on xnat:{assr}')
                 continue
 
-            # Check for already cleared
-            try:
-                if is_sgp:
-                    _status = list(dfs[dfs.ASSR == assr].QCSTATUS).pop()
-                else:
-                    _status = list(dfa[dfa.ASSR == assr].QCSTATUS).pop()
-            except Exception as err:
-                logger.info(f'get status from xnat:{assr}')
-                _status = assessor.attrs.get(f'{xsitype}/validation/status')
+            a = assessors[assr]
 
-            if _status == 'Job Pending':
-                logger.info(f'already cleared xnat:{assr}')
+            if a['QCSTATUS'] == 'Job Pending':
+                # Already cleared, only needs status reset
+                _clear = False
+                _resources = []
             else:
-                # Clear previous results
-                logger.info(f'clearing xnat attributes:{assr}')
-                assessor.attrs.mset({
-                    f'{xsitype}/validation/status': 'Job Pending',
-                    f'{xsitype}/jobid': ' ',
-                    f'{xsitype}/memused': ' ',
-                    f'{xsitype}/walltimeused': ' ',
-                    f'{xsitype}/jobnode': ' ',
-                })
+                _clear = True
+                _resources = resources.get(assr, '').split(',')
+                _resources = [x for x in _resources if x]
+                _resources = [x for x in _resources if x not in SKIP_LIST]
+
+            plan.append({
+                'ID': t['ID'],
+                'ASSR': assr,
+                'SUBJECT': a['SUBJECT'],
+                'SESSION': a.get('SESSION', None),
+                'SGP': bool(is_sgp),
+                'CLEAR': _clear,
+                'RESOURCES': sorted(set(_resources)),
+            })
 
-                resources = assessor.resources()
-                resources = [x for x in resources if x.label() not in SKIP_LIST]
-                for res in resources:
-                    logger.info(f'deleting xnat resource:{assr}:{res.label()}')
-                    try:
-                        res.delete()
-                    except Exception:
-                        logger.error('deleting xnat resource')
+        return pd.DataFrame(plan)
 
-            # Append new record for redcap
-            records.append({
-                def_field: project,
-                'redcap_repeat_instrument': 'taskqueue',
-                'redcap_repeat_instance': t['ID'],
-                'task_status': 'QUEUED',
-                'task_timeused': '',
-                'task_memused': '',
-                'task_failcount': '1',
-            })
+    def _retry_assessor(self, project, a):
+        if a['SGP']:
+            return self.xnat().select(
+                f'/projects/{project}/subjects/{a["SUBJECT"]}/experiment/{a["ASSR"]}')
+        else:
+            return self.xnat().select_assessor(
+                project, a['SUBJECT'], a['SESSION'], a['ASSR'])
 
-        for i, t in failed_tasks.iterrows():
-            assr = t['ASSESSOR']
+    def _retry_apply(self, project, plan):
+        '''Delete resources, reset attributes on xnat and tasks on redcap.'''
+        updater = self.task_status_updater(chunk_size=RETRY_CHUNK)
+        assessors = plan.to_dict('records')
 
-            if proctype:
-                if is_sgp_assessor(t['ASSESSOR']):
-                    if assr.split('-x-')[2] != proctype:
-                        continue
-                else:
-                    if assr.split('-x-')[3] != proctype:
-                        continue
+        def _delete(a, res):
+            logger.info(f'deleting xnat resource:{a["ASSR"]}:{res}')
+            self._retry_assessor(project, a).resource(res).delete()
 
-            # Connect to the assessor on xnat
-            if is_sgp_assessor(t['ASSESSOR']):
+        def _reset(a):
+            if a['SGP']:
                 xsitype = 'proc:subjgenprocdata'
-                _subj = assr.split('-x-')[1]
-                assessor = self.xnat().select(f'/projects/{project}/subjects/{_subj}/experiment/{assr}')
             else:
                 xsitype = 'proc:genprocdata'
-                assessor = self.xnat().select_assessor(
-                    project,
-                    assr.split('-x-')[1],
-                    assr.split('-x-')[2],
-                    assr)
 
-            if not assessor.exists():
-                logger.debug(f'assessor not found on xnat:{assr}')
-                continue
-
-            logger.debug('set xnat procstatus to JOB_RUNNING')
-            assessor.attrs.mset({
+            attrs = {
                 f'{xsitype}/procstatus': 'JOB_RUNNING',
                 f'{xsitype}/jobstartdate': str(date.today()),
-            })
+            }
 
-        if records:
-            # Apply the updates in one call
-            try:
-                response = self._rcq.import_records(records)
-                assert 'count' in response
-                logger.debug('retry task records updated')
-            except AssertionError as err:
-                logger.error(f'failed to set task statuses:{err}')
+            if a['CLEAR']:
+                logger.info(f'clearing xnat attributes:{a["ASSR"]}')
+                attrs.update({
+                    f'{xsitype}/validation/status': 'Job Pending',
+                    f'{xsitype}/jobid': ' ',
+                    f'{xsitype}/memused': ' ',
+                    f'{xsitype}/walltimeused': ' ',
+                    f'{xsitype}/jobnode': ' ',
+                })
+
+            self._retry_assessor(project, a).attrs.mset(attrs)
+
+        with ThreadPoolExecutor(max_workers=RETRY_WORKERS) as executor:
+            # Delete previous results
+            futures = [executor.submit(_delete, a, r) for a in assessors for r in a['RESOURCES']]
+            for f in as_completed(futures):
+                try:
+                    f.result()
+                except Exception as err:
+                    logger.error(f'deleting xnat resource:{err}')
+
+            # Set all attributes of each assessor in one call
+            futures = {executor.submit(_reset, a): a for a in assessors}
+            for f in as_completed(futures):
+                a = futures[f]
+                try:
+                    f.result()
+                except Exception as err:
+                    logger.error(f'setting xnat attributes:{a["ASSR"]}:{err}')
+                    continue
+
+                # Reset the task on redcap
+                updater.add(
+                    project,
+                    a['ID'],
+                    'QUEUED',
+                    task_timeused='',
+                    task_memused='',
+                    task_failcount='1')
+
+        if len(updater) > 0:
+            updater.flush()
+            logger.debug(f'retry task status metrics:{updater.metrics()}')
         else:
             logger.debug('retry, nothing to update')
 
@@ -3731,6 +3827,87 @@ def is_sgp_assessor(assessor):
     return re.match(SGP_PATTERN, assessor)
 
 
+def _proctype_filter(proctypes):
+    # REDCap filter logic to only export stats of proctypes
+    if not proctypes:
+        return None
+
+    return ' or '.join(
+        f'contains([stats_assr], "-x-{x}-x-")' for x in proctypes)
+
+
+def _filter_assessors(
+    df,
+    proctypes=None,
+    sesstypes=None,
+    subjects=None,
+    sessions=None,
+    startdate=None,
+    enddate=None
+):
+    if proctypes:
+        df = df[df.PROCTYPE.isin(proctypes)]
+
+    if sesstypes:
+        df = df[df.SESSTYPE.isin(sesstypes)]
+
+    if subjects:
+        df = df[df.SUBJECT.isin(subjects)]
+
+    if sessions:
+        df = df[df.SESSION.isin(sessions)]
+
+    if startdate:
+        df = df[pd.to_datetime(df.DATE) >= pd.to_datetime(startdate)]
+
+    if enddate:
+        df = df[pd.to_datetime(df.DATE) <= pd.to_datetime(enddate)]
+
+    return df
+
+
+def _stats_pivot(df):
+    # Integer codes for assessors and names, filters are checked per label
+    rows, assrs = pd.factorize(df.stats_assr)
+    cols, names = pd.factorize(df.stats_name)
+
+    # Filter out FS6 if found, old, and old FS7 stats names
+    keep = ~assrs.str.contains('FS6_v1', regex=False)[rows]
+    keep &= ~names.str.startswith('fs7_')[cols]
+
+    # First value of each assessor and name
+    keep &= ~pd.Series(rows * len(names) + cols).duplicated().to_numpy()
+
+    df = df[keep]
+    rows, used = pd.factorize(rows[keep])
+    assrs = assrs[used]
+    cols, used = pd.factorize(cols[keep])
+    names = names[used]
+
+    # Parse values once, names with any text value stay as text
+    text = df.stats_value.to_numpy(dtype=object)
+    values = pd.to_numeric(df.stats_value, errors='coerce').to_numpy(
+        dtype='float64')
+    is_text = np.zeros(len(names), dtype=bool)
+    is_text[cols[np.isnan(values) & (df.stats_value != '').to_numpy()]] = True
+
+    numeric = np.full((len(assrs), len(names)), np.nan)
+    numeric[rows, cols] = values
+
+    data = {name: numeric[:, i] for i, name in enumerate(names)}
+
+    for i in np.flatnonzero(is_text):
+        column = np.full(len(assrs), np.nan, dtype=object)
+        mask = cols == i
+        column[rows[mask]] = text[mask]
+        data[names[i]] = column
+
+    wide = pd.DataFrame(data, columns=sorted(names))
+    wide.insert(0, 'stats_assr', assrs)
+
+    return wide
+
+
 def _subject_pivot(df):
     # Pivot to one row per subject
     level_cols = ['SESSTYPE', 'PROCTYPE']
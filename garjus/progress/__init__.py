@@ -4,6 +4,7 @@ Manage progress reports. Update will create any missing.
 
 """
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
 import logging
 import os, shutil
@@ -26,6 +27,9 @@ logger = logging.getLogger('garjus.progress')
 
 SUBJECTS_COLUMNS = ['ID', 'PROJECT', 'GROUP', 'AGE', 'SEX']
 
+# Projects loaded concurrently for exports
+LOAD_WORKERS = 4
+
 
 def update(garjus, projects=None):
     """Update project progress."""
@@ -68,6 +72,12 @@ def make_progress(garjus, project, cur_progress, now):
         garjus.add_progress(project, cur_progress, now, pdf_file, zip_file)
 
 
+def _load_projects(projects, load):
+    """Call load(p) for each project concurrently, results in same order."""
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        return list(executor.map(load, projects))
+
+
 def make_export_zip(garjus, filename, projects, proctypes, sesstypes, sessions):
     stats = pd.DataFrame()
     subjects = pd.DataFrame()
@@ -84,13 +94,16 @@ def make_export_zip(garjus, filename, projects, proctypes, sesstypes, sessions):
     if sessions is not None and not isinstance(sessions, list):
         sessions = sessions.split(',')
 
-    for p in sorted(projects):
-        # Load project subjects
+    def _load(p):
+        # Load project subjects and stats
         psubjects = garjus.subjects(p).reset_index()
+        pstats = garjus.stats(
+            p, proctypes=proctypes, sesstypes=sesstypes, sessions=sessions)
+        return psubjects, pstats
 
-        # Load project stats
-        pstats = garjus.stats(p, proctypes=proctypes, sesstypes=sesstypes)
-
+    for p, (psubjects, pstats) in zip(
+        sorted(projects), _load_projects(sorted(projects), _load)
+    ):
         # Check for empty
         if len(pstats) == 0:
             logger.info(f'no stats for project:{p}')
@@ -183,13 +196,15 @@ def make_statshot(
     if exclude is not None and not isinstance(exclude, list):
         exclude = exclude.split(',')
 
-    for p in sorted(projects):
-        # Load project subjects
+    def _load(p):
+        # Load project subjects and stats
         psubjects = garjus.subjects(p).reset_index()
-
-        # Load project stats
         pstats = garjus.stats(p, proctypes=proctypes, sesstypes=sesstypes)
+        return psubjects, pstats
 
+    for p, (psubjects, pstats) in zip(
+        sorted(projects), _load_projects(sorted(projects), _load)
+    ):
         # Check for empty
         if len(pstats) == 0:
             logger.info(f'no stats for project:{p}')
@@ -320,12 +335,7 @@ def make_stats_csv(
     if sessions is not None and not isinstance(sessions, list):
         sessions = sessions.split(',')
 
-    for p in sorted(projects):
-        # Load stats
-        stats = garjus.stats(
-            p, proctypes=proctypes, sesstypes=sesstypes, persubject=persubject)
-        df = pd.concat([df, stats])
-
+    subjects = None
     if analysis:
         # Get the list of subjects for specified analysis and apply as filter
         logger.info(f'{analysis=}')
@@ -335,6 +345,19 @@ def make_stats_csv(
         a = garjus.load_analysis(project, analysis_id)
         subjects = a['SUBJECTS'].splitlines()
         logger.debug(f'applying subject filter to include:{subjects}')
+
+    for p in sorted(projects):
+        # Load stats of only the subjects and sessions needed
+        stats = garjus.stats(
+            p,
+            proctypes=proctypes,
+            sesstypes=sesstypes,
+            persubject=persubject,
+            subjects=subjects,
+            sessions=sessions)
+        df = pd.concat([df, stats])
+
+    if analysis:
         df = df[df.SUBJECT.isin(subjects)]
 
         # Append rows for missing subjects and resort
@@ -350,7 +373,7 @@ def make_stats_csv(
                 )
             ]).sort_values('SUBJECT')
 
-    if sessions:
+    if sessions and 'SESSION' in df.columns:
         df = df[df.SESSION.isin(sessions)]
         logger.info(f'filter sessions:{sessions}')
 
@@ -4,12 +4,16 @@ update will create any missing
 
 """
 import logging
-import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 logger = logging.getLogger(__name__)
 
 
+# Sessions downloaded and uploaded concurrently
+SESSION_WORKERS = 4
+
+
 def update(garjus, projects, scantypes=None):
     """Update project progress."""
 
@@ -46,24 +50,47 @@ def update_project(garjus, project, scantypes):
     df = df[df['QUALITY'] != 'unusable']
     logger.debug(f'scans after filtering out unusable:{len(df)}')
 
-    # Iterate xnat scans
-    for r in df.sort_values('SESSION_SCANID').to_dict('records'):
-        try: 
-            if 'JSON' in r['RESOURCES']:
-                update_scan(
-                    garjus,
-                    r['PROJECT'],
-                    r['SUBJECT'],
-                    r['SESSION'],
-                    r['SCANID'],
-                )
-            else:
-                logger.debug(f'no JSON resource')
-
-        except ConnectionError as err:
-            logger.info(err)
-            logger.info('waiting a minute')
-            os.sleep(60)
+    # Only scans with JSON
+    df = df[df.RESOURCES.str.contains('JSON', regex=False, na=False)]
+
+    # One download and one upload per session, sessions concurrently
+    sessions = [
+        (proj, subj, sess, sorted(g.SCANID.astype(str)))
+        for (proj, subj, sess), g in df.groupby(['PROJECT', 'SUBJECT', 'SESSION'])]
+
+    logger.debug(f'sessions to update:{len(sessions)}')
+
+    with ThreadPoolExecutor(max_workers=SESSION_WORKERS) as executor:
+        futures = [executor.submit(update_session, garjus, *x) for x in sessions]
+        for f in as_completed(futures):
+            f.result()
+
+
+def update_session(garjus, proj, subj, sess, scans):
+    """Update stats of scans in session with one download and upload."""
+    try:
+        stats = garjus.get_session_scan_stats(proj, subj, sess, scans)
+    except Exception as err:
+        logger.warning(f'could not get session scans, trying each:{sess}:{err}')
+        for scan in scans:
+            update_scan(garjus, proj, subj, sess, scan)
+        return
+
+    # Only scans where we got something
+    stats = {k: v for k, v in stats.items() if _has_stats(v)}
+    if not stats:
+        logger.debug(f'nothing to upload:{sess}')
+        return
+
+    try:
+        logger.debug(f'uploading:{proj}:{subj}:{sess}:{sorted(stats)}')
+        garjus.set_session_scan_stats(proj, subj, sess, stats)
+    except Exception as err:
+        logger.warning(f'could not set stats:{sess}:{err}')
+
+
+def _has_stats(stats):
+    return stats.get('duration', False) or stats.get('tr', False) or stats.get('tracer', False)
 
 
 def update_scan(garjus, proj, subj, sess, scan):
@@ -72,16 +99,16 @@ def update_scan(garjus, proj, subj, sess, scan):
     try:
         stats = garjus.get_scan_stats(proj, subj, sess, scan)
     except Exception as err:
-        logger.warn(f'could not set stats:{sess}:{scan}:{err}')
+        logger.warning(f'could not set stats:{sess}:{scan}:{err}')
         return
 
-    if stats.get('duration', False) or stats.get('tr', False) or stats.get('tracer', False):
+    if _has_stats(stats):
         # we go something so upload it
         try:
             logger.debug(f'uploading:{proj}:{subj}:{sess}:{scan}')
             garjus.set_scan_stats(proj, subj, sess, scan, stats)
         except Exception as err:
-            logger.warn(f'could not set stats:{sess}:{scan}:{err}')
+            logger.warning(f'could not set stats:{sess}:{scan}:{err}')
             return
     else:
         logger.debug('nothing to upload')
@@ -6,16 +6,32 @@ update will create any missing
 import tempfile
 import csv
 import logging
-import glob
 import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 
+from . import archive
+
 
 logger = logging.getLogger(__name__)
 
 
+# Concurrent downloads, parsed stats waiting to upload, log interval
+DOWNLOAD_WORKERS = 8
+UPLOAD_QUEUE = 32
+LOG_EVERY = 100
+
+# STATS resources up to this size are read into memory file by file,
+# larger are downloaded as a zip and extracted
+STREAM_MAX_BYTES = 1024 * 1024
+
+
 def update(garjus, projects, proctypes=None):
     """Update project."""
     if not garjus.xnat_enabled():
@@ -35,9 +51,17 @@ def update(garjus, projects, proctypes=None):
         logger.debug(f'stats updating project:{p},proctypes={ptypes}')
         update_project(garjus, p, ptypes)
 
-        if 'BrainAgeGap_v2' in ptypes:
-            logger.debug('getting bag_age_gap')
-            _get_bag(garjus, p)
+        # Derived stats read the new stats, archive must be current
+        _sync_archive(garjus, p)
+
+        if update_derived(garjus, p, ptypes):
+            _sync_archive(garjus, p)
+
+
+def _sync_archive(garjus, project):
+    if archive.exists(project, garjus.cachedir()):
+        logger.debug(f'syncing stats archive:{project}')
+        garjus.sync_stats_archive(project)
 
 
 def update_project(garjus, project, proctypes):
@@ -76,20 +100,8 @@ def update_project(garjus, project, proctypes):
     dfa = dfa[dfa['QCSTATUS'] != 'Failed']
     logger.debug(f'assessors after filtering out QC Failed:{len(dfa)}')
 
-    # Iterate xnat assessors
-    for r in dfa.sort_values('ASSR').to_dict('records'):
-        try:
-            update_assessor(
-                garjus,
-                r['PROJECT'],
-                r['SUBJECT'],
-                r['SESSION'],
-                r['ASSR'],
-            )
-        except ConnectionError as err:
-            logger.info(err)
-            logger.info('waiting a minute')
-            os.sleep(60)
+    # Download, parse and upload stats of xnat assessors
+    _harvest(garjus, dfa.sort_values('ASSR').to_dict('records'))
 
     # Subject Assessors
     dfa = garjus.subject_assessors([project], proctypes)
@@ -115,74 +127,262 @@ def update_project(garjus, project, proctypes):
     dfa = dfa[dfa['QCSTATUS'] != 'Failed']
     logger.debug(f'subject assessors after filtering out QC Failed:{len(dfa)}')
 
-    # Iterate xnat assessors
-    for r in dfa.sort_values('ASSR').to_dict('records'):
+    # Download, parse and upload stats of xnat subject assessors
+    _harvest(garjus, dfa.sort_values('ASSR').to_dict('records'), sgp=True)
+
+
+def _log_throughput(counts, start):
+    secs = max(time.time() - start, 0.001)
+    for stage in ['download', 'parse', 'upload']:
+        logger.info(f'stats {stage}:{counts[stage]} in {secs:.0f}s ({counts[stage] / secs:.2f}/s)')
+
+    if counts['error']:
+        logger.info(f'stats errors:{counts["error"]}')
+
+
+def _harvest(garjus, records, sgp=False):
+    """Download and parse stats with a pool of workers, upload in batches.
+
+    Downloads and parsing run in DOWNLOAD_WORKERS threads while one thread
+    adds the stats to a batch that imports many assessors per call. When
+    the upload queue is full, workers wait, and when all workers are busy,
+    no more downloads are started.
+    """
+    if not records:
+        return
+
+    uploads = queue.Queue(maxsize=UPLOAD_QUEUE)
+    slots = threading.BoundedSemaphore(DOWNLOAD_WORKERS * 2)
+    lock = threading.Lock()
+    counts = Counter()
+    start = time.time()
+
+    def _count(stage):
+        with lock:
+            counts[stage] += 1
+
+    def _imported(labels):
+        # Called by the batch after each import
+        with lock:
+            before = counts['upload']
+            counts['upload'] += len(labels)
+
+        if before // LOG_EVERY != counts['upload'] // LOG_EVERY:
+            _log_throughput(counts, start)
+
+    # Stats of many assessors are imported together, whole assessors per import
+    batch = garjus.stats_batch(records[0]['PROJECT'], on_import=_imported)
+
+    def _fetch(r):
         try:
-            update_subject_assessor(
-                garjus,
-                r['PROJECT'],
-                r['SUBJECT'],
-                r['ASSR'],
-            )
-        except ConnectionError as err:
-            logger.info(err)
-            logger.info('waiting a minute')
-            os.sleep(60)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                try:
+                    _source = _download_stats(garjus, r, tmpdir, sgp=sgp)
+                except Exception as err:
+                    logger.warning(f'could not get stats:{r["ASSR"]}:{err}')
+                    _count('error')
+                    return
+
+                _count('download')
+
+                try:
+                    _stats = _transform_source(_source)
+                except Exception as err:
+                    logger.warning(f'could not parse stats:{r["ASSR"]}:{err}')
+                    _count('error')
+                    return
+
+                _count('parse')
+
+            # Waits here when uploads are behind
+            uploads.put((r, _stats))
+        finally:
+            slots.release()
+
+    def _upload():
+        while True:
+            item = uploads.get()
+            if item is None:
+                break
+
+            r, _stats = item
+            logger.debug(f'uploading assessor stats:{r["ASSR"]}')
+            try:
+                rec = garjus.stats_records(r['SUBJECT'], r['ASSR'], _stats)
+            except Exception as err:
+                logger.error(f'could not set stats:{r["ASSR"]}:{err}')
+                _count('error')
+                continue
+
+            failed = len(batch.failed)
+            try:
+                batch.add(rec, r['ASSR'])
+            except Exception as err:
+                # Can be any assessors in the chunk, not only this one
+                lost = batch.failed[failed:]
+                logger.error(f'could not import stats:{",".join(lost)}:{err}')
+                with lock:
+                    counts['error'] += len(lost)
+
+    logger.info(f'harvesting stats:{len(records)} assessors')
+
+    uploader = threading.Thread(target=_upload)
+    uploader.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            for r in records:
+                # Waits here when workers are all busy
+                slots.acquire()
+                executor.submit(_fetch, r)
+    finally:
+        uploads.put(None)
+        uploader.join()
+
+        try:
+            batch.flush()
+        except Exception as err:
+            logger.error(f'could not upload stats:{err}')
+
+        lost = batch.failed + batch.pending()
+        if lost:
+            logger.error(f'stats not uploaded:{len(lost)} assessors:{",".join(lost)}')
+
+    _log_throughput(counts, start)
+    logger.info(f'stats records imported:{batch.imported} in {batch.imports} imports')
+
+
+def _download_stats(garjus, r, tmpdir, sgp=False):
+    """Get stats files as dict of name to text, or directory if large."""
+    if sgp:
+        files = garjus.get_sgp_source_stats_files(
+            r['PROJECT'], r['SUBJECT'], r['ASSR'])
+    else:
+        files = garjus.get_source_stats_files(
+            r['PROJECT'], r['SUBJECT'], r['SESSION'], r['ASSR'])
+
+    if sum(x['Size'] for x in files) <= STREAM_MAX_BYTES:
+        # Read only the files we will parse
+        name2uri = {x['Name']: x['URI'] for x in files}
+        return {
+            name: garjus.get_resource_text(name2uri[name])
+            for name, _ in _select_stats_files(list(name2uri.keys()))}
+
+    logger.debug(f'downloading zip:{r["ASSR"]}')
+    if sgp:
+        return garjus.get_sgp_source_stats(
+            r['PROJECT'], r['SUBJECT'], r['ASSR'], tmpdir)
+    else:
+        return garjus.get_source_stats(
+            r['PROJECT'], r['SUBJECT'], r['SESSION'], r['ASSR'], tmpdir)
+
+
+def _transform_source(source):
+    if isinstance(source, dict):
+        return transform_stats_text(source)
+    else:
+        return transform_stats(source)
 
 
 def update_assessor(garjus, proj, subj, sess, assr):
     """Update assessor stats."""
     logger.debug(f'uploading assessor stats:{assr}')
+    r = {'PROJECT': proj, 'SUBJECT': subj, 'SESSION': sess, 'ASSR': assr}
     with tempfile.TemporaryDirectory() as tmpdir:
         try:
-            _dir = garjus.get_source_stats(proj, subj, sess, assr, tmpdir)
+            _source = _download_stats(garjus, r, tmpdir)
         except Exception as err:
             logger.warn(f'could not get stats:{assr}:{err}')
             return
 
-        _stats = transform_stats(_dir)
+        _stats = _transform_source(_source)
         garjus.set_stats(proj, subj, sess, assr, _stats)
 
 
 def update_subject_assessor(garjus, proj, subj, assr):
     """Update subject assessor stats."""
     logger.debug(f'uploading subject assessor stats:{assr}')
-
+    r = {'PROJECT': proj, 'SUBJECT': subj, 'ASSR': assr}
     with tempfile.TemporaryDirectory() as tmpdir:
-        try:    
+        try:
             logger.debug(f'{proj}:{subj}:{assr}:{tmpdir}')
-            _dir = garjus.get_sgp_source_stats(proj, subj, assr, tmpdir)
+            _source = _download_stats(garjus, r, tmpdir, sgp=True)
         except Exception as err:
             logger.warn(f'could not get stats:{assr}:{err}')
             import traceback
             traceback.print_exc()
             return
 
-        _stats = transform_stats(_dir)
+        _stats = _transform_source(_source)
         garjus.set_sgp_stats(proj, subj, assr, _stats)
 
 
+def _select_stats_files(names):
+    """Choose which stats files to load and how, from list of file names."""
+    if 'stats.csv' in names:
+        return [('stats.csv', 'sniff')]
+    elif 'stats.txt' in names:
+        return [('stats.txt', 'sniff')]
+    elif 'fmriqa_stats.csv' in names:
+        return [('fmriqa_stats.csv', 'tall')]
+
+    txt_names = sorted(x for x in names if x.endswith('.txt'))
+    if txt_names:
+        return [(x, 'tall') for x in txt_names]
+
+    # Handle proctypes that output multiple csv
+    return [(x, 'wide') for x in sorted(names) if x.endswith('.csv')]
+
+
 def transform_stats(stats_dir):
     """Transform stats from directory of files to dict."""
     data = {}
 
-    if os.path.exists(f'{stats_dir}/stats.csv'):
-        data = _load_stats(f'{stats_dir}/stats.csv')
-    elif os.path.exists(f'{stats_dir}/stats.txt'):
-        data = _load_stats(f'{stats_dir}/stats.txt')
-    elif os.path.exists(f'{stats_dir}/fmriqa_stats.csv'):
-        data.update(_load_stats_tall(f'{stats_dir}/fmriqa_stats.csv'))
-    elif len(glob.glob(f'{stats_dir}/*.txt')) > 0:
-        for txt_path in glob.iglob(f'{stats_dir}/*.txt'):
-            data.update(_load_stats_tall(txt_path))
-    else:
-        # Handle proctypes that output multiple csv
-        for csv_path in glob.iglob(f'{stats_dir}/*.csv'):
-            data.update(_load_stats_wide(csv_path))
+    try:
+        names = os.listdir(stats_dir)
+    except FileNotFoundError:
+        return data
+
+    for name, kind in _select_stats_files(names):
+        filename = os.path.join(stats_dir, name)
+        with open(filename, newline='') as f:
+            data.update(_parse_stats(f.read(), kind, filename))
+
+    return data
+
+
+def transform_stats_text(files):
+    """Transform stats from dict of file name to file contents."""
+    data = {}
+
+    for name, kind in _select_stats_files(list(files.keys())):
+        data.update(_parse_stats(files[name], kind, name))
 
     return data
 
 
+def _parse_stats(text, kind, name=''):
+    if kind == 'sniff':
+        kind = _sniff_stats(text)
+
+    if kind == 'tall':
+        return _parse_stats_tall(text, name)
+    else:
+        return _parse_stats_wide(text)
+
+
+def _sniff_stats(text):
+    # Tall files are key=value or key,value, wide have a header row
+    lines = text.splitlines()
+    if not lines:
+        return 'tall'
+
+    if ('=' in lines[0]) or (len(lines) >= 3 and len(lines[0].split(',')) <= 3):
+        return 'tall'
+    else:
+        return 'wide'
+
+
 def _isfloat(num):
     try:
         float(num)
@@ -191,59 +391,94 @@ def _isfloat(num):
         return False
 
 
-def _load_stats_wide(filename):
+def _parse_stats_wide(text):
     data = {}
+    reader = csv.reader(text.splitlines())
 
-    with open(filename, newline='') as f:
-        # Connect csv reader
-        reader = csv.reader(f)
-
-        # Load header from first line
-        header = next(reader)
+    # Load header from first line
+    header = next(reader, [])
 
-        # Read data from subsequent lines
-        for line in reader:
-            for i, v in enumerate(line):
-                data[header[i]] = v
+    # Read data from subsequent lines, later rows replace earlier
+    for line in reader:
+        data.update(zip(header, line))
 
     return data
 
 
-def _load_stats_tall(filename):
-    data = {}
-    rows = []
-
-    try:
-        with open(filename) as f:
-            rows = f.readlines()
+def _parse_stats_tall(text, name=''):
+    rows = text.splitlines()
 
-        if len(rows) == 1 and rows[0].startswith('excess_spikes') and 'spike_count' in rows[0]:
-            _tmp = rows[0]
-            rows[0] = _tmp.split('spike_count')[0]
-            rows.append('spike_count' + _tmp.split('spike_count')[1])
+    if len(rows) == 1 and rows[0].startswith('excess_spikes') and 'spike_count' in rows[0]:
+        _tmp = rows[0]
+        rows[0] = _tmp.split('spike_count')[0]
+        rows.append('spike_count' + _tmp.split('spike_count')[1])
 
-        for r in rows:
-            (k, v) = r.strip().replace('=', ',').split(',')
-            data[k] = v
+    try:
+        # Each line must be exactly one key and one value
+        data = dict(r.replace('=', ',').split(',') for r in map(str.strip, rows) if r)
     except ValueError:
-        logger.error(f'cannot load stats file:{filename}')
+        logger.error(f'cannot load stats file:{name}')
         return {}
 
     return data
 
 
-def _load_stats(filename):
-    lines = []
+def _load_stats_wide(filename):
+    with open(filename, newline='') as f:
+        return _parse_stats_wide(f.read())
+
+
+def _load_stats_tall(filename):
     with open(filename) as f:
-        lines = f.readlines()
+        return _parse_stats_tall(f.read(), filename)
 
-    if ('=' in lines[0]) or (len(lines) >= 3 and len(lines[0].split(',')) <= 3):
-        return _load_stats_tall(filename)
-    else:
-        return _load_stats_wide(filename)
 
+def _load_stats(filename):
+    with open(filename, newline='') as f:
+        return _parse_stats(f.read(), 'sniff', filename)
+
+
+def update_derived(garjus, project, proctypes):
+    """Compute derived stats of project and upload in bulk.
+
+    Returns count of assessors with derived stats uploaded.
+    """
+    count = 0
+
+    for proctype, derive in DERIVED_STATS:
+        if proctype not in proctypes:
+            continue
+
+        stats = garjus.stats(project, proctypes=[proctype])
+        if stats.empty:
+            continue
+
+        logger.debug(f'deriving stats:{project}:{derive.__name__}')
+        derived = derive(garjus, project, stats)
+        if derived is None or derived.empty:
+            continue
+
+        stat_cols = [x for x in derived.columns if x not in ['ASSR', 'SUBJECT']]
+        imported = []
+
+        try:
+            with garjus.stats_batch(project, on_import=imported.extend) as batch:
+                for r in derived.to_dict('records'):
+                    data = {k: r[k] for k in stat_cols if pd.notna(r[k])}
+                    rec = garjus.stats_records(r['SUBJECT'], r['ASSR'], data)
+                    batch.add(rec, r['ASSR'])
+        except Exception as err:
+            # Do not stop updating other projects
+            logger.error(f'could not upload derived stats:{project}:{derive.__name__}:{err}')
+
+        logger.info(f'{project}:{derive.__name__}:uploaded:{len(imported)}')
+        count += len(imported)
 
-def _get_bag(garjus, project):
+    return count
+
+
+def _derive_bag(garjus, project, stats):
+    """bag_age_gap from predicted age and age at scan from DOB."""
 
     # Get subjects with DOB
     subjects = garjus.subjects(project, include_dob=True)
@@ -251,67 +486,44 @@ def _get_bag(garjus, project):
         logger.debug('DOB not found, cannot calculate bag_age_gap')
         return
 
-    # Get BAG stats
-    stats = garjus.stats(project, proctypes=['BrainAgeGap_v2'])
-
-    if stats.empty:
-        return
-
-    # Merge in DOB
-    subjects['SUBJECT'] = subjects['ID']
-    stats = pd.merge(stats, subjects[['SUBJECT','DOB']], on='SUBJECT')
-
     if 'bag_age_gap' in stats:
         # Only rows without existing bag_age_gap
         stats = stats[stats.bag_age_gap.isna()]
 
-    # Only rows with DATE
-    stats = stats[~stats.DATE.isna()]
+    # Merge in DOB
+    subjects['SUBJECT'] = subjects['ID']
+    stats = pd.merge(stats, subjects[['SUBJECT', 'DOB']], on='SUBJECT')
 
-    # Only rows with DOB
-    stats = stats[~stats.DOB.isna()]
+    # Only rows with DATE and DOB
+    stats = stats[stats.DATE.notna() & stats.DOB.notna()]
 
-    # Calculate age at scan
-    stats['SCANDAYS'] = pd.to_datetime(stats['DATE']) - stats['DOB']
-    stats['BAGDAYS'] = (stats['bag_age_pred'].astype(float) * 365.25).astype('timedelta64[D]')
-    stats['bag_age_gap'] = (stats['BAGDAYS'] - stats['SCANDAYS'])/np.timedelta64(365, 'D')
+    # Predicted age in whole days minus age at scan, in years
+    scandays = (pd.to_datetime(stats['DATE']) - stats['DOB']) / np.timedelta64(1, 'D')
+    bagdays = np.trunc(stats['bag_age_pred'].astype(float) * 365.25)
+    stats['bag_age_gap'] = (bagdays - scandays) / 365
 
-    # Batch upload new stats
-    for i, s in stats.iterrows():
-        logger.debug(f'set bag_age_gap:{s.ASSR}')
-        garjus.set_stats(
-            project,
-            s.SUBJECT,
-            s.SESSION,
-            s.ASSR,
-            {'bag_age_gap': s.bag_age_gap})
+    return stats[['ASSR', 'SUBJECT', 'bag_age_gap']]
 
 
-def _get_bag_nodob(garjus, project):
+def _derive_bag_nodob(garjus, project, stats):
+    """bag_age_gap from predicted age and current age of subject."""
     subjects = garjus.subjects(project)
 
-    # Get BAG stats
-    stats = garjus.stats(project, proctypes=['BrainAgeGap_v2'])
-
-    if stats.empty:
-        return
-
-    stats = pd.merge(
-        stats, subjects[['AGE']], left_on='SUBJECT', right_index=True)
-
     if 'bag_age_gap' in stats:
         # Only rows without existing bag_age_gap
         stats = stats[stats.bag_age_gap.isna()]
 
+    stats = pd.merge(
+        stats, subjects[['AGE']], left_on='SUBJECT', right_index=True)
+
     stats['bag_age_gap'] = (stats['bag_age_pred'].astype(float) - stats['AGE'].astype(float))
 
-    # Batch upload new stats
-    for i, s in stats.iterrows():
-        logger.debug(f'set bag_age_gap:{s.ASSR}')
-        garjus.set_stats(
-            project,
-            s.SUBJECT,
-            s.SESSION,
-            s.ASSR,
-            {'bag_age_gap': s.bag_age_gap})
+    return stats[['ASSR', 'SUBJECT', 'bag_age_gap']]
+
+
+# Derived stats, the proctype read and the function that returns a frame
+# of ASSR, SUBJECT and one column per derived stat, run in order
+DERIVED_STATS = [
+    ('BrainAgeGap_v2', _derive_bag),
+]
 
@@ -0,0 +1,120 @@
+"""Local Parquet archive of a project stats REDCap, synced incrementally.
+
+The archive holds the same tall rows as the stats REDCap, one file per
+project. Syncing only exports assessors that are new or whose number of
+stats changed since the last sync, assessors removed from REDCap are
+removed from the archive. Values edited in place in REDCap are not
+noticed, a full sync exports all assessors again. Parquet needs pyarrow
+installed.
+"""
+import logging
+import os
+
+import pandas as pd
+
+
+logger = logging.getLogger('garjus.stats.archive')
+
+
+ARCHIVE_DIR = 'statsarchive'
+
+ARCHIVE_COLS = ['stats_assr', 'stats_name', 'stats_value']
+
+# Assessors per export when syncing
+SYNC_CHUNK = 100
+
+
+def archive_file(project, cachedir):
+    return os.path.join(cachedir, ARCHIVE_DIR, f'{project}.parquet')
+
+
+def exists(project, cachedir):
+    """True if project has been synced to the archive."""
+    return os.path.exists(archive_file(project, cachedir))
+
+
+def load(project, cachedir, proctypes=None):
+    """Load archived stats rows, optionally only for proctypes."""
+    df = pd.read_parquet(archive_file(project, cachedir), columns=ARCHIVE_COLS)
+
+    if proctypes:
+        # Match on the proctype part of the assessor label
+        keep = [x for x in df.stats_assr.unique() if any(
+            f'-x-{p}-x-' in x for p in proctypes)]
+        df = df[df.stats_assr.isin(keep)]
+
+    return df
+
+
+def _save(df, filename):
+    # Write to a temporary file and then replace so readers never see a
+    # partial archive
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmpfile = f'{filename}.{os.getpid()}.tmp'
+    df.to_parquet(tmpfile, index=False)
+    os.replace(tmpfile, filename)
+
+
+def assessor_filter(assessors):
+    """REDCap filter logic to only export stats of assessors."""
+    return ' or '.join(f'[stats_assr] = "{x}"' for x in assessors)
+
+
+def sync(statsrc, project, cachedir, chunk_size=SYNC_CHUNK, full=False):
+    """Update archive from stats REDCap, returns counts of assessors.
+
+    With full, all assessors are exported again, not only those changed.
+    """
+    filename = archive_file(project, cachedir)
+
+    # Number of stats per assessor in REDCap
+    rec = statsrc.export_records(fields=['stats_assr'])
+    remote = pd.Series(
+        [x['stats_assr'] for x in rec if x.get('stats_assr')],
+        dtype=object).value_counts()
+
+    if os.path.exists(filename):
+        df = pd.read_parquet(filename, columns=ARCHIVE_COLS)
+    else:
+        df = pd.DataFrame(columns=ARCHIVE_COLS)
+
+    local = df.stats_assr.value_counts()
+
+    # New assessors and assessors with stats added or removed
+    if full:
+        changed = remote.index
+    else:
+        changed = remote[remote != local.reindex(remote.index)].index
+    removed = local.index.difference(remote.index)
+
+    logger.debug(f'{project}:sync changed={len(changed)}:removed={len(removed)}')
+
+    fetched = []
+    changed = sorted(changed)
+    for i in range(0, len(changed), chunk_size):
+        chunk = changed[i:i + chunk_size]
+        logger.debug(f'{project}:exporting stats:{i + len(chunk)}/{len(changed)}')
+        fetched.extend(statsrc.export_records(
+            fields=ARCHIVE_COLS, filter_logic=assessor_filter(chunk)))
+
+    counts = {
+        'added': int((~pd.Index(changed).isin(local.index)).sum()),
+        'updated': int(pd.Index(changed).isin(local.index).sum()),
+        'removed': len(removed),
+    }
+
+    if not changed and not len(removed) and os.path.exists(filename):
+        logger.debug(f'{project}:archive up to date')
+        return counts
+
+    fetched = pd.DataFrame(fetched, columns=ARCHIVE_COLS)
+    fetched = fetched[fetched.stats_assr.isin(changed)]
+
+    df = df[~df.stats_assr.isin(changed) & ~df.stats_assr.isin(removed)]
+    df = pd.concat([df, fetched], ignore_index=True)
+
+    _save(df, filename)
+
+    logger.info(f'{project}:archived stats:{counts}')
+
+    return counts
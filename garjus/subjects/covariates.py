@@ -1,5 +1,6 @@
 '''Subjects from REDCap.'''
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import numpy as np
@@ -563,41 +564,33 @@ def export_clinical():
 def export(garjus, tmpdir, subjects_df):
     data = {}
 
-    # Save csv for each type filtered by subject list
-    _data = _export_examiner(garjus, tmpdir, subjects_df)
-    if not _data.empty:
-        _data['SITE'] = 'VUMC'
-        _data.loc[_data.ID.str.startswith('P'), 'SITE'] = 'UPMC'
-        data['examiner'] = _data
+    # Load each type concurrently, each saves its own csv
+    exports = [
+        ('examiner', _export_examiner),
+        ('gaitrite', _export_gaitrite),
+        ('plasma', _export_plasma),
+        ('toolbox', _export_toolbox),
+        ('fallypride', _export_fallypride),
+        ('msit_vitals', _export_msit_vitals),
+    ]
 
-    _data = _export_gaitrite(garjus, tmpdir, subjects_df)
-    if not _data.empty:
-        _data['SITE'] = 'VUMC'
-        _data.loc[_data.ID.str.startswith('P'), 'SITE'] = 'UPMC'
-        data['gaitrite'] = _data 
+    with ThreadPoolExecutor(max_workers=len(exports)) as executor:
+        futures = [
+            (name, executor.submit(func, garjus, tmpdir, subjects_df))
+            for name, func in exports]
 
-    _data = _export_plasma(garjus, tmpdir, subjects_df)
-    if not _data.empty:
-        _data['SITE'] = 'VUMC'
-        _data.loc[_data.ID.str.startswith('P'), 'SITE'] = 'UPMC'
-        data['plasma'] = _data
+    for name, future in futures:
+        _data = future.result()
+        if _data.empty:
+            continue
 
-    _data = _export_toolbox(garjus, tmpdir, subjects_df)
-    if not _data.empty:
         _data['SITE'] = 'VUMC'
-        _data.loc[_data.ID.str.startswith('P'), 'SITE'] = 'UPMC'
-        data['toolbox'] = _data
+        if name in ['examiner', 'gaitrite', 'plasma', 'toolbox']:
+            _data.loc[_data.ID.str.startswith('P'), 'SITE'] = 'UPMC'
+        elif name == 'msit_vitals':
+            _data.loc[_data.ID.str.startswith('2'), 'SITE'] = 'UPMC'
+            _data.loc[_data.ID.str.startswith('3'), 'SITE'] = 'UIC'
 
-    _data = _export_fallypride(garjus, tmpdir, subjects_df)
-    if not _data.empty:
-        _data['SITE'] = 'VUMC'
-        data['fallypride'] = _data
-
-    _data = _export_msit_vitals(garjus, tmpdir, subjects_df)
-    if not _data.empty:
-        _data['SITE'] = 'VUMC'
-        _data.loc[_data.ID.str.startswith('2'), 'SITE'] = 'UPMC'
-        _data.loc[_data.ID.str.startswith('3'), 'SITE'] = 'UIC'
-        data['msit_vitals'] = _data
+        data[name] = _data
 
     return data
@@ -1,12 +1,15 @@
 """dax queue 2 garjus queue."""
 import subprocess
-from io import StringIO
 import logging
 import os
 from datetime import datetime
 
 import pandas as pd
 
+from . import history
+from .history import _label2proctype
+from .scheduler import SlurmScheduler, SQUEUE_COLS
+
 logger = logging.getLogger('dax2garjus')
 
 
@@ -20,17 +23,12 @@ logger = logging.getLogger('dax2garjus')
 # This is a temporary bridge between garjus and dax.
 
 USER = 'vuiis_daily_singularity'
-SQUEUE = 'squeue -u vuiis_daily_singularity --format="%j|%A|%L|%m|%M|%p|%t|%u|%S|%T|%V|%l|"'
 RESDIR = '/nobackup/vuiis_daily_singularity/Spider_Upload_Dir'
 
 JOB_TAB_COLS = [
     'LABEL', 'PROJECT', 'STATUS', 'PROCTYPE', 'USER',
     'JOBID', 'TIME', 'WALLTIME', 'LASTMOD']
 
-SQUEUE_COLS = [
-    'NAME', 'ST', 'STATE', 'PRIORITY', 'JOBID', 'MIN_MEMORY',
-    'TIME', 'SUBMIT_TIME', 'START_TIME', 'TIME_LIMIT', 'TIME_LEFT', 'USER']
-
 # we concat diskq status and squeue status to make a single status
 # squeue states: CG, F, PR, S, ST
 # diskq statuses: JOB_RUNNING, JOB_FAILED, NEED_TO_RUN, COMPLETE,
@@ -48,13 +46,25 @@ STATUS_MAP = {
     'READY_TO_COMPLETENONE': 'COMPLETE',
     'READY_TO_UPLOADNONE': 'COMPLETE'}
 
+# sacct states of jobs that ended without dax writing a procstatus,
+# e.g. killed by slurm, only used for tasks with no diskq status
+FINISHED_MAP = {
+    'F': 'FAILED',
+    'TO': 'FAILED',
+    'CA': 'FAILED',
+    'OOM': 'FAILED',
+    'NF': 'FAILED'}
+
+
+def _load_dax_queue(scheduler=None):
+    if scheduler is None:
+        scheduler = SlurmScheduler(USER)
 
-def _load_dax_queue():
     logger.debug('loading diskq')
     diskq_df = _load_diskq_queue()
 
     logger.debug('loading squeue')
-    squeue_df = _load_slurm_queue()
+    squeue_df, finished_df = _load_slurm_queue(scheduler)
 
     # merge squeue data into task queue
     logger.debug('merging data')
@@ -73,9 +83,9 @@ def _load_dax_queue():
 
     if not df.empty:
         # assessor label is delimited by "-x-", first element is project,
-        # fourth element is processing type
+        # processing type is fourth for sessions, third for subjects
         df['PROJECT'] = df['LABEL'].str.split('-x-', n=1, expand=True)[0]
-        df['PROCTYPE'] = df['LABEL'].str.split('-x-', n=4, expand=True)[3]
+        df['PROCTYPE'] = df['LABEL'].apply(_label2proctype)
 
         # Add some text to avoid blanks in the table
         df['JOBID'].astype(str).fillna('not in queue', inplace=True)
@@ -84,6 +94,16 @@ def _load_dax_queue():
         df['psST'] = df['procstatus'].fillna('NONE') + df['ST'].fillna('NONE')
         df['STATUS'] = df['psST'].map(STATUS_MAP).fillna('UNKNOWN')
 
+        # Tasks in diskq with no status and no job that ended in slurm
+        ended = dict(zip(finished_df.LABEL, finished_df.ST.map(FINISHED_MAP)))
+        ended = df['LABEL'].map(ended)
+        mask = (
+            df['procstatus'].isna() &
+            df['ST'].isna() &
+            df['LABEL'].isin(diskq_df.LABEL) &
+            ended.notna())
+        df.loc[mask, 'STATUS'] = ended[mask]
+
     # Determine how long ago status changed
     # how long has it been running, pending, waiting or complete?
 
@@ -133,18 +153,28 @@ def _load_diskq_task(diskq, assr):
         'LASTMOD': _get_diskq_lastmod(diskq, assr)}
 
 
-# Load slurm data
-def _load_slurm_queue():
+# Load slurm data, jobs in the queue and jobs that ended since last load.
+# Ended jobs are returned separately, they must not be merged with diskq
+# status since dax has already written the final status of most of them.
+def _load_slurm_queue(scheduler):
+    columns = SQUEUE_COLS + ['LABEL']
+
     try:
-        cmd = SQUEUE
-        result = subprocess.run([cmd], shell=True, stdout=subprocess.PIPE)
-        _data = result.stdout.decode('utf-8')
-        df = pd.read_csv(
-            StringIO(_data), delimiter='|', usecols=SQUEUE_COLS)
-        df['LABEL'] = df['NAME'].str.split('.slurm').str[0]
-        return df
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame(columns=SQUEUE_COLS+['LABEL'])
+        finished = scheduler.finished()
+    except (OSError, subprocess.CalledProcessError) as err:
+        logger.debug(f'cannot load finished jobs:{err}')
+        finished = pd.DataFrame(columns=['LABEL', 'ST'])
+
+    try:
+        df = scheduler.jobs()
+    except (OSError, subprocess.CalledProcessError) as err:
+        logger.debug(f'cannot load squeue:{err}')
+        df = pd.DataFrame(columns=columns)
+
+    # Still in the queue wins, e.g. requeued
+    finished = finished[~finished.LABEL.isin(df.LABEL)]
+
+    return df.reindex(columns=columns), finished.reindex(columns=['LABEL', 'ST'])
 
 
 def _get_diskq_walltime(diskq, assr):
@@ -224,7 +254,7 @@ def _get_xnat_changes(garjus_queue, assessors):
     return df
 
 
-def dax2queue(garjus):
+def dax2queue(garjus, scheduler=None):
     # load diskq, run squeue to get updates, compare to g queue, apply changes
     # in a single call
 
@@ -236,8 +266,11 @@ def dax2queue(garjus):
     # Get the garjus queue as stored in redcap
     gqueue = garjus.tasks()
 
+    if scheduler is None:
+        scheduler = SlurmScheduler(USER, cachedir=garjus.cachedir())
+
     # Get the dax queue on disk
-    dqueue = _load_dax_queue()
+    dqueue = _load_dax_queue(scheduler)
 
     # Filter projects to only those garjus knows
     dqueue = dqueue[dqueue.PROJECT.isin(garjus.projects())]
@@ -258,3 +291,10 @@ def dax2queue(garjus):
     else:
         logger.info('applying status changes')
         garjus.set_task_statuses(df)
+
+        # Save the transitions to local job history
+        try:
+            df = pd.merge(df, gqueue[['ID', 'PROJECT', 'ASSESSOR']])
+            history.record(df, cachedir=garjus.cachedir())
+        except Exception as err:
+            logger.warning(f'failed to record job history:{err}')
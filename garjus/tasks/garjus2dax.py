@@ -3,9 +3,14 @@ import shutil
 import logging
 import os
 import json
+from collections import Counter
 
+import pandas as pd
 from dax import cluster
 from .processors import load_from_yaml
+from .dax2garjus import _load_dax_queue
+from . import history
+from .history import _label2proctype
 
 
 logger = logging.getLogger('garjus2dax')
@@ -36,6 +41,28 @@ HOST = 'https://xnat2.vanderbilt.edu/xnat'
 USER = 'daxspider'
 TEMPLATE = '/data/mcr/centos7/dax_templates/job_template_v3.txt'
 
+# Dispatch limits. Jobs already in DISKQ/squeue count against these, so
+# each run only tops up the queue to the limits.
+MAX_INFLIGHT = 500
+PROJECT_MAX = 200
+PROCTYPE_MAX = 200
+
+# Per-project and per-proctype overrides of the default caps above,
+# e.g. {'FS7_v1': 100}
+PROJECT_LIMITS = {}
+PROCTYPE_LIMITS = {}
+
+# Higher priority proctypes dispatch first, default priority is 0
+PROCTYPE_PRIORITY = {}
+
+QUEUED_STATUSES = ['JOB_QUEUED', 'QUEUED']
+
+# Task status updates per REDCap import
+STATUS_CHUNK = 50
+
+# dax queue statuses that count as in flight
+INFLIGHT_STATUSES = ['RUNNING', 'PENDING', 'WAITING']
+
 
 def _write_processor_spec(
     filename,
@@ -169,53 +196,145 @@ def _task2dax(
     shutil.chown(processor_spec_path, group='h_vuiisadmin')
 
 
-def queue2dax(garjus):
+def _load_inflight():
+    """Load jobs currently in DISKQ/squeue that have not finished."""
+    df = _load_dax_queue()
+    return df[df.STATUS.isin(INFLIGHT_STATUSES)]
 
-    # Get the current task table from garjus
-    tasks = garjus.tasks()
 
-    # Update each task
-    for i, t in tasks.iterrows():
-        assr = t['ASSESSOR']
-        status = t['STATUS']
+def _schedule(tasks, inflight):
+    """Select queued tasks to dispatch, fair-share across projects.
+
+    Tasks are taken one at a time from the project with the highest priority
+    task next in line, ties going to the project with the fewest jobs in
+    flight. Project, proctype and global caps include jobs already in flight.
+    """
+    selected = []
+
+    available = MAX_INFLIGHT - len(inflight)
+    if available <= 0:
+        logger.info(f'queue is full:{len(inflight)} jobs in flight')
+        return selected
+
+    project_counts = Counter(inflight.PROJECT)
+    proctype_counts = Counter(inflight.PROCTYPE)
+
+    queued = tasks[tasks.STATUS.isin(QUEUED_STATUSES)].copy()
+    if queued.empty:
+        return selected
+
+    queued['PROCTYPE'] = queued.ASSESSOR.apply(_label2proctype)
+    queued['PRIORITY'] = queued.PROCTYPE.map(
+        lambda x: PROCTYPE_PRIORITY.get(x, 0))
+    queued['ORDER'] = queued.ID.astype(int)
+    queued = queued.sort_values(['PRIORITY', 'ORDER'], ascending=[False, True])
 
-        if status not in ['JOB_QUEUED', 'QUEUED']:
-            logger.debug(f'skipping:{i}:{assr}:{status}')
+    # Line of tasks waiting in each project
+    lines = {p: list(df.to_dict('records')) for p, df in queued.groupby(
+        'PROJECT', sort=False)}
+
+    while len(selected) < available and lines:
+        project = min(lines, key=lambda p: (
+            -lines[p][0]['PRIORITY'], project_counts[p], p))
+
+        if project_counts[project] >= PROJECT_LIMITS.get(project, PROJECT_MAX):
+            logger.debug(f'project at limit:{project}')
+            del lines[project]
             continue
 
-        logger.info(f'{i}:{assr}:{status}')
-
-        walltime = t['WALLTIME']
-        memreq = t['MEMREQ']
-        inputlist = json.loads(t['INPUTLIST'], strict=False)
-        var2val = json.loads(t['VAR2VAL'], strict=False)
-        yaml_file = t['YAMLFILE']
-        user_inputs = t['USERINPUTS']
-
-        try:
-            # Locate the yaml file
-            if yaml_file == 'CUSTOM':
-                # Download it locally
-                yaml_file = garjus.save_task_yaml(
-                    t['PROJECT'], t['ID'], f'{RESDIR}/DISKQ/processor')
-                shutil.chown(yaml_file, group='h_vuiisadmin')
-            else:
-                # We already have a local copy so point to it
-                yaml_file = os.path.join(garjus._yamldir, yaml_file)
-
-            _task2dax(
-                garjus.xnat(),
-                assr,
-                walltime,
-                memreq,
-                yaml_file,
-                user_inputs,
-                inputlist,
-                var2val)
-
-            garjus.set_task_status(t['PROJECT'], t['ID'], 'JOB_RUNNING')
-
-        except Exception as err:
-            logger.error(err)
-            import traceback
-            traceback.print_exc()
+        t = lines[project].pop(0)
+        if not lines[project]:
+            del lines[project]
+
+        proctype = t['PROCTYPE']
+        if proctype_counts[proctype] >= PROCTYPE_LIMITS.get(
+            proctype, PROCTYPE_MAX
+        ):
+            logger.debug(f'proctype at limit:{proctype}:{t["ASSESSOR"]}')
+            continue
+
+        project_counts[project] += 1
+        proctype_counts[proctype] += 1
+        selected.append(t)
+
+    return selected
+
+
+def queue2dax(garjus):
+
+    # Get the current task table from garjus
+    tasks = garjus.tasks()
+
+    # Get the jobs already running/waiting in dax
+    inflight = _load_inflight()
+    logger.info(f'jobs in flight:{len(inflight)}')
+
+    # Choose which tasks to dispatch
+    selected = _schedule(tasks, inflight)
+    logger.info(f'dispatching:{len(selected)} of {len(tasks)} tasks')
+
+    _record_history(garjus, tasks[tasks.STATUS.isin(QUEUED_STATUSES)])
+    dispatched = []
+
+    # Status updates are imported in chunks, and on the way out if we fail
+    with garjus.task_status_updater(chunk_size=STATUS_CHUNK) as updater:
+        for t in selected:
+            if _dispatch(garjus, t):
+                updater.add(t['PROJECT'], t['ID'], 'JOB_RUNNING')
+                dispatched.append(dict(t, STATUS='JOB_RUNNING'))
+
+    logger.info(f'task status metrics:{updater.metrics()}')
+
+    _record_history(garjus, pd.DataFrame(dispatched))
+
+
+def _dispatch(garjus, t):
+    """Write task to dax, returns True if written."""
+    assr = t['ASSESSOR']
+    status = t['STATUS']
+
+    logger.info(f'{t["ID"]}:{assr}:{status}')
+
+    walltime = t['WALLTIME']
+    memreq = t['MEMREQ']
+    inputlist = json.loads(t['INPUTLIST'], strict=False)
+    var2val = json.loads(t['VAR2VAL'], strict=False)
+    yaml_file = t['YAMLFILE']
+    user_inputs = t['USERINPUTS']
+
+    try:
+        # Locate the yaml file
+        if yaml_file == 'CUSTOM':
+            # Download it locally
+            yaml_file = garjus.save_task_yaml(
+                t['PROJECT'], t['ID'], f'{RESDIR}/DISKQ/processor')
+            shutil.chown(yaml_file, group='h_vuiisadmin')
+        else:
+            # We already have a local copy so point to it
+            yaml_file = os.path.join(garjus._yamldir, yaml_file)
+
+        _task2dax(
+            garjus.xnat(),
+            assr,
+            walltime,
+            memreq,
+            yaml_file,
+            user_inputs,
+            inputlist,
+            var2val)
+
+        return True
+
+    except Exception as err:
+        logger.error(err)
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def _record_history(garjus, tasks):
+    # History is only for analytics, never let it stop the queue
+    try:
+        history.record(tasks, cachedir=garjus.cachedir())
+    except Exception as err:
+        logger.warning(f'failed to record job history:{err}')
@@ -0,0 +1,178 @@
+"""Job history, task status transitions saved to a local sqlite file.
+
+Each transition is appended with the time it was first seen, so the
+history is only as precise as how often dax2queue/queue2dax run.
+"""
+import logging
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+
+logger = logging.getLogger('garjus.tasks.history')
+
+
+DBNAME = 'jobhistory.db'
+
+QUEUED_STATUSES = ['QUEUED', 'JOB_QUEUED']
+
+DONE_STATUSES = ['COMPLETE', 'JOB_FAILED', 'FAILED']
+
+HISTORY_COLS = ['TIME', 'PROJECT', 'PROCTYPE', 'ASSESSOR', 'ID', 'STATUS']
+
+SUMMARY_COLS = [
+    'PROCTYPE', 'FINISHED', 'FAILED', 'PERDAY',
+    'WAIT_P50', 'WAIT_P90', 'WAIT_P99',
+    'RUN_P50', 'RUN_P90', 'RUN_P99']
+
+
+def _default_cachedir():
+    return os.path.expanduser('~/.garjus')
+
+
+def _connect(cachedir=None):
+    dbfile = os.path.join(cachedir or _default_cachedir(), DBNAME)
+
+    conn = sqlite3.connect(dbfile)
+    conn.execute('''CREATE TABLE IF NOT EXISTS transitions (
+        time REAL, project TEXT, proctype TEXT, assessor TEXT,
+        task_id TEXT, status TEXT)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS transitions_time
+        ON transitions (time)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS latest (
+        assessor TEXT PRIMARY KEY, status TEXT)''')
+
+    return conn
+
+
+def _label2proctype(label):
+    # Session assessor labels have five parts, subject assessors have four
+    parts = label.split('-x-')
+    if len(parts) > 4:
+        return parts[3]
+    elif len(parts) == 4:
+        return parts[2]
+    else:
+        return ''
+
+
+def record(tasks, cachedir=None):
+    """Append status transitions for tasks with PROJECT/ASSESSOR/ID/STATUS.
+
+    Tasks with the same status as last recorded are skipped.
+    """
+    now = time.time()
+    count = 0
+
+    if len(tasks) == 0:
+        return count
+
+    conn = _connect(cachedir)
+    try:
+        with conn:
+            latest = dict(conn.execute('SELECT assessor, status FROM latest'))
+
+            for t in tasks.to_dict('records'):
+                assr = t['ASSESSOR']
+                status = t['STATUS']
+
+                if not assr or latest.get(assr) == status:
+                    continue
+
+                conn.execute(
+                    'INSERT INTO transitions VALUES (?, ?, ?, ?, ?, ?)',
+                    (now, t['PROJECT'], _label2proctype(assr), assr,
+                     str(t['ID']), status))
+                conn.execute(
+                    'INSERT OR REPLACE INTO latest VALUES (?, ?)',
+                    (assr, status))
+                latest[assr] = status
+                count += 1
+    finally:
+        conn.close()
+
+    logger.debug(f'recorded transitions:{count}')
+
+    return count
+
+
+def load(projects=None, days=None, cachedir=None):
+    """Load transitions as dataframe, optionally limited to recent days."""
+    query = 'SELECT * FROM transitions'
+    params = []
+
+    if days:
+        query += ' WHERE time >= ?'
+        params.append(time.time() - days * 86400)
+
+    conn = _connect(cachedir)
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+    df.columns = HISTORY_COLS
+
+    if projects:
+        df = df[df.PROJECT.isin(projects)]
+
+    return df
+
+
+def summary(projects=None, days=30, cachedir=None):
+    """Throughput, queue wait and runtime percentiles per proctype.
+
+    Wait is hours from QUEUED to RUNNING on the cluster, run is hours from
+    RUNNING to done. Each time a task is queued again starts a new attempt.
+    """
+    df = load(projects=projects, days=days, cachedir=cachedir)
+
+    if df.empty:
+        return pd.DataFrame(columns=SUMMARY_COLS)
+
+    df = df.sort_values(['ASSESSOR', 'TIME'])
+
+    # Number the attempts of each assessor
+    df['ATTEMPT'] = df.STATUS.isin(QUEUED_STATUSES).astype(int)
+    df['ATTEMPT'] = df.groupby('ASSESSOR').ATTEMPT.cumsum()
+
+    # First time each attempt reached each stage
+    df['STAGE'] = None
+    df.loc[df.STATUS.isin(QUEUED_STATUSES), 'STAGE'] = 'QUEUED'
+    df.loc[df.STATUS == 'RUNNING', 'STAGE'] = 'RUNNING'
+    df.loc[df.STATUS.isin(DONE_STATUSES), 'STAGE'] = 'DONE'
+    df['FAILED'] = df.STATUS.isin(['JOB_FAILED', 'FAILED'])
+
+    attempts = df.dropna(subset=['STAGE']).pivot_table(
+        index=['PROCTYPE', 'ASSESSOR', 'ATTEMPT'],
+        columns='STAGE',
+        values='TIME',
+        aggfunc='min')
+    attempts = attempts.reindex(columns=['QUEUED', 'RUNNING', 'DONE'])
+    attempts['WAIT'] = (attempts.RUNNING - attempts.QUEUED) / 3600
+    attempts['RUN'] = (attempts.DONE - attempts.RUNNING) / 3600
+    attempts = attempts.reset_index()
+
+    failed = df[df.FAILED].groupby('PROCTYPE').ASSESSOR.count()
+
+    rows = []
+    for proctype, a in attempts.groupby('PROCTYPE'):
+        finished = int(a.DONE.notna().sum())
+        wait = a.WAIT.dropna()
+        run = a.RUN.dropna()
+        rows.append({
+            'PROCTYPE': proctype,
+            'FINISHED': finished,
+            'FAILED': int(failed.get(proctype, 0)),
+            'PERDAY': round(finished / days, 2) if days else None,
+            'WAIT_P50': wait.quantile(0.5),
+            'WAIT_P90': wait.quantile(0.9),
+            'WAIT_P99': wait.quantile(0.99),
+            'RUN_P50': run.quantile(0.5),
+            'RUN_P90': run.quantile(0.9),
+            'RUN_P99': run.quantile(0.99),
+        })
+
+    return pd.DataFrame(rows, columns=SUMMARY_COLS).round(2)
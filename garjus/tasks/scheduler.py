@@ -0,0 +1,151 @@
+"""Cluster scheduler adapters used to load job state for the dax queue."""
+import logging
+import os
+import subprocess
+import time
+from datetime import datetime
+from io import StringIO
+
+import pandas as pd
+
+
+logger = logging.getLogger('garjus.tasks.scheduler')
+
+
+SQUEUE_FORMAT = '%j|%A|%L|%m|%M|%p|%t|%u|%S|%T|%V|%l|'
+
+SQUEUE_COLS = [
+    'NAME', 'ST', 'STATE', 'PRIORITY', 'JOBID', 'MIN_MEMORY',
+    'TIME', 'SUBMIT_TIME', 'START_TIME', 'TIME_LIMIT', 'TIME_LEFT', 'USER']
+
+SACCT_FORMAT = 'JobName%200,JobID,State,Start,End,Elapsed,User'
+
+SACCT_COLS = ['NAME', 'JOBID', 'STATE', 'START_TIME', 'END_TIME', 'TIME', 'USER']
+
+# sacct reports the full state, squeue the compact code
+SACCT2ST = {
+    'COMPLETED': 'CD',
+    'FAILED': 'F',
+    'TIMEOUT': 'TO',
+    'CANCELLED': 'CA',
+    'OUT_OF_MEMORY': 'OOM',
+    'NODE_FAIL': 'NF',
+    'PREEMPTED': 'PR',
+}
+
+SNAPSHOT = 'squeue.pkl'
+
+
+def _label(df):
+    df['LABEL'] = df['NAME'].str.split('.slurm').str[0]
+    return df
+
+
+class SlurmScheduler:
+    """Loads jobs from squeue/sacct, caches the last snapshot on disk.
+
+    A snapshot younger than maxage seconds is reused instead of running
+    squeue again. The time of the previous snapshot is used as the start
+    of the sacct window so only jobs finished since then are loaded.
+    """
+
+    def __init__(self, user, cachedir=None, maxage=60):
+        self.user = user
+        self.maxage = maxage
+        self._cachedir = cachedir or os.path.expanduser('~/.garjus')
+        self._snapshot = None
+        self._snapshot_time = None
+
+    def _snapshot_file(self):
+        return os.path.join(self._cachedir, f'{self.user}.{SNAPSHOT}')
+
+    def _read_snapshot(self):
+        filename = self._snapshot_file()
+
+        if self._snapshot is None and os.path.exists(filename):
+            try:
+                self._snapshot = pd.read_pickle(filename)
+                self._snapshot_time = os.path.getmtime(filename)
+            except Exception as err:
+                logger.debug(f'cannot read snapshot:{filename}:{err}')
+
+        return self._snapshot, self._snapshot_time
+
+    def _write_snapshot(self, df):
+        self._snapshot = df
+        self._snapshot_time = time.time()
+
+        try:
+            df.to_pickle(self._snapshot_file())
+        except Exception as err:
+            logger.debug(f'cannot save snapshot:{err}')
+
+    def _run(self, args):
+        result = subprocess.run(args, stdout=subprocess.PIPE, check=True)
+        return result.stdout.decode('utf-8')
+
+    def jobs(self, refresh=False):
+        """Jobs currently in squeue, one row per job."""
+        df, snapshot_time = self._read_snapshot()
+
+        if not refresh and df is not None and (
+            time.time() - snapshot_time < self.maxage
+        ):
+            logger.debug('using squeue snapshot')
+            return df
+
+        logger.debug('running squeue')
+        _data = self._run([
+            'squeue', '-u', self.user, f'--format={SQUEUE_FORMAT}'])
+
+        try:
+            df = pd.read_csv(
+                StringIO(_data), delimiter='|', usecols=SQUEUE_COLS)
+            df = _label(df)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame(columns=SQUEUE_COLS + ['LABEL'])
+
+        self._write_snapshot(df)
+
+        return df
+
+    def finished(self, since=None):
+        """Jobs that ended since time, default is the previous snapshot."""
+        if since is None:
+            _, since = self._read_snapshot()
+
+        if since is None:
+            return pd.DataFrame(columns=SACCT_COLS + ['ST', 'LABEL'])
+
+        start = datetime.fromtimestamp(since).strftime('%Y-%m-%dT%H:%M:%S')
+
+        logger.debug(f'running sacct:{start}')
+        _data = self._run([
+            'sacct', '-u', self.user, '-X', '-n', '-P',
+            '-S', start,
+            '-s', ','.join(SACCT2ST.keys()),
+            f'--format={SACCT_FORMAT}'])
+
+        df = pd.read_csv(
+            StringIO(_data), delimiter='|', names=SACCT_COLS, dtype=str)
+
+        # State can have a suffix such as "CANCELLED by 123"
+        df['STATE'] = df['STATE'].str.split(' ').str[0]
+        df['ST'] = df['STATE'].map(SACCT2ST)
+
+        return _label(df)
+
+
+class FakeScheduler:
+    """Scheduler with fixed jobs for testing, nothing is run."""
+
+    def __init__(self, jobs=None, finished=None):
+        self._jobs = pd.DataFrame(jobs, columns=SQUEUE_COLS)
+        self._finished = pd.DataFrame(finished, columns=SACCT_COLS)
+        self._finished['ST'] = self._finished['STATE'].map(SACCT2ST)
+
+    def jobs(self, refresh=False):
+        return _label(self._jobs.copy())
+
+    def finished(self, since=None):
+        return _label(self._finished.copy())
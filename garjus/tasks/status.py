@@ -0,0 +1,90 @@
+"""Task status updates, coalesced and imported to REDCap in chunks."""
+import logging
+
+from ..utils_redcap import import_records_chunked
+
+
+logger = logging.getLogger('garjus.tasks.status')
+
+
+class StatusUpdater:
+    """Collects task status updates and imports them in chunks.
+
+    Updates to the same task are merged so only the latest is imported.
+    Pending updates are imported when chunk_size is reached, on flush() and
+    on leaving a with block, including when leaving with an error.
+    """
+
+    def __init__(self, rcq, chunk_size=500):
+        self._rcq = rcq
+        self._chunk_size = chunk_size
+        self._pending = {}
+        self.updates = 0
+        self.imported = 0
+        self.flushes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        logger.debug(f'task status metrics:{self.metrics()}')
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, project, task_id, status, **fields):
+        """Queue a status update, extra fields are set on the record too."""
+        key = (project, str(task_id))
+
+        record = self._pending.get(key, {
+            self._rcq.def_field: project,
+            'redcap_repeat_instrument': 'taskqueue',
+            'redcap_repeat_instance': task_id,
+        })
+
+        record['task_status'] = status
+        record.pop('taskqueue_complete', None)
+        if status == 'COMPLETE':
+            # Set the redcap complete indicator too
+            record['taskqueue_complete'] = '2'
+        elif status == 'JOB_FAILED':
+            record['taskqueue_complete'] = '0'
+
+        record.update(fields)
+
+        self._pending[key] = record
+        self.updates += 1
+
+        if len(self._pending) >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Import pending updates, returns count imported."""
+        if not self._pending:
+            return 0
+
+        records = list(self._pending.values())
+        self._pending = {}
+
+        try:
+            count = import_records_chunked(
+                self._rcq, records, chunk_size=self._chunk_size)
+        except AssertionError as err:
+            logger.error(f'failed to set task statuses:{err}')
+            return 0
+
+        self.imported += count
+        self.flushes += 1
+        logger.debug(f'task status records updated:{count}')
+
+        return count
+
+    def metrics(self):
+        """Counts of updates added, records imported and flushes."""
+        return {
+            'updates': self.updates,
+            'imported': self.imported,
+            'flushes': self.flushes,
+            'per_flush': round(self.imported / self.flushes, 1) if self.flushes else 0,
+        }
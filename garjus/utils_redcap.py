@@ -1,10 +1,19 @@
 import os
 import logging
+import time
 
 import redcap
+import requests
 import pandas as pd
 
 
+# Errors worth retrying, the server is busy or unreachable
+RETRY_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
 def download_named_file(
     project,
     record_id,
@@ -90,6 +99,180 @@ def upload_file(
             file_object=f)
 
 
+def import_records_retry(project, records, retries=5, backoff=5):
+    """Import records, retrying with exponential backoff if server busy."""
+    for attempt in range(retries + 1):
+        try:
+            response = project.import_records(records)
+            assert 'count' in response
+            return int(response['count'])
+        except RETRY_ERRORS as err:
+            if attempt == retries:
+                raise
+
+            wait = backoff * (2 ** attempt)
+            logging.warning(f'import failed, retry in {wait}s:{err}')
+            time.sleep(wait)
+
+
+def import_records_chunked(project, records, chunk_size=500):
+    """Import records in chunks, returns count of records imported."""
+    count = 0
+
+    for i in range(0, len(records), chunk_size):
+        chunk = records[i:i + chunk_size]
+        count += import_records_retry(project, chunk)
+        logging.debug(f'imported records:{count}/{len(records)}')
+
+    return count
+
+
+class RecordBatch:
+    """Accumulates records and imports them in size-bounded chunks.
+
+    Records added together, such as the stats of one assessor, are always
+    imported in the same chunk so a failed import never leaves them half
+    imported. on_import is called with the keys of each imported group,
+    keys of groups that could not be imported are kept in failed.
+
+    The chunk size adapts to how long each import takes, doubling while
+    imports finish under half of target_secs and halving when they take
+    longer than target_secs or fail after retries.
+    """
+
+    def __init__(
+        self,
+        project,
+        chunk_size=1000,
+        min_size=50,
+        max_size=10000,
+        target_secs=20,
+        on_import=None,
+    ):
+        self._project = project
+        # (key, records) of each group added
+        self._groups = []
+        self._count = 0
+        self.chunk_size = chunk_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_secs = target_secs
+        self.on_import = on_import
+        # Keys of groups that failed to import
+        self.failed = []
+        self.imported = 0
+        self.imports = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def __len__(self):
+        return self._count
+
+    def pending(self):
+        """Keys of groups not imported yet."""
+        return [k for k, _ in self._groups]
+
+    def add(self, records, key=None):
+        """Add records as one group, imports full chunks."""
+        if not records:
+            return
+
+        self._groups.append((key, list(records)))
+        self._count += len(records)
+
+        while self._count >= self.chunk_size:
+            self._import_chunk()
+
+    def flush(self):
+        """Import all remaining records, returns total imported."""
+        while self._groups:
+            self._import_chunk()
+
+        return self.imported
+
+    def _next_chunk(self):
+        # Whole groups up to chunk_size, at least one group
+        groups = self._groups[:1]
+        size = len(groups[0][1])
+        for g in self._groups[1:]:
+            if size + len(g[1]) > self.chunk_size:
+                break
+
+            groups.append(g)
+            size += len(g[1])
+
+        return groups
+
+    def _drop(self, groups):
+        del self._groups[:len(groups)]
+        self._count -= sum(len(records) for _, records in groups)
+
+    def _imported_groups(self, groups, count):
+        self.imported += count
+        self.imports += 1
+
+        if self.on_import:
+            self.on_import([k for k, _ in groups])
+
+    def _import_each(self, groups):
+        # Import groups one at a time so only the bad ones fail
+        error = None
+        for key, records in groups:
+            try:
+                count = import_records_retry(self._project, records)
+                self._imported_groups([(key, records)], count)
+            except Exception as err:
+                logging.warning(f'import failed:{key}:{err}')
+                self.failed.append(key)
+                error = err
+
+        if error:
+            raise error
+
+    def _import_chunk(self):
+        groups = self._next_chunk()
+        chunk = [x for _, records in groups for x in records]
+
+        start = time.time()
+        try:
+            count = import_records_retry(self._project, chunk)
+        except RETRY_ERRORS:
+            if len(groups) == 1 or len(chunk) <= self.min_size:
+                # Drop them so later chunks can still be imported
+                self._drop(groups)
+                self.failed.extend(k for k, _ in groups)
+                raise
+
+            # Try again with smaller chunks
+            self.chunk_size = max(self.chunk_size // 2, self.min_size)
+            logging.warning(f'import failed, chunk size:{self.chunk_size}')
+            return
+        except Exception:
+            # Not the server, bad records, never send this chunk again
+            self._drop(groups)
+            if len(groups) == 1:
+                self.failed.append(groups[0][0])
+                raise
+
+            self._import_each(groups)
+            return
+
+        secs = time.time() - start
+
+        self._drop(groups)
+        self._imported_groups(groups, count)
+        logging.debug(f'imported:{count} records in {secs:.1f}s')
+
+        if secs > self.target_secs:
+            self.chunk_size = max(self.chunk_size // 2, self.min_size)
+        elif secs < self.target_secs / 2:
+            self.chunk_size = min(self.chunk_size * 2, self.max_size)
+
+
 def get_redcap(project_id=None, key_file=None, api_url=None, api_key=None):
     # Check for overrides in environment vars
     api_url = os.environ.get('REDCAP_API_URL', api_url)
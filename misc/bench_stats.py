@@ -0,0 +1,141 @@
+"""Benchmark stats file parsing on generated FS7, fmriqa and Multi_Atlas outputs.
+
+Compares the previous line-by-line loaders with transform_stats, and
+times parsing alone with files already in memory.
+
+usage: python misc/bench_stats.py [count]
+"""
+import csv
+import glob
+import os
+import sys
+import tempfile
+import time
+
+from garjus.stats import transform_stats, transform_stats_text
+
+
+def _write_fs7(stats_dir):
+    # Several wide csv files, one header row and one row of values
+    for name in ['aseg', 'lh.aparc', 'rh.aparc', 'lh.thickness', 'rh.thickness', 'hipp']:
+        cols = [f'{name}_roi{i}' for i in range(120)]
+        with open(f'{stats_dir}/{name}.csv', 'w') as f:
+            f.write(','.join(cols) + '\n')
+            f.write(','.join(f'{i * 1.5:.4f}' for i in range(len(cols))) + '\n')
+
+
+def _write_fmriqa(stats_dir):
+    # Tall key,value
+    with open(f'{stats_dir}/fmriqa_stats.csv', 'w') as f:
+        for i in range(30):
+            f.write(f'fmriqa_v4_stat{i},{i * 0.01:.4f}\n')
+
+
+def _write_multiatlas(stats_dir):
+    # Tall, sniffed from stats.csv
+    with open(f'{stats_dir}/stats.csv', 'w') as f:
+        for i in range(210):
+            f.write(f'ma_label{i},{i * 10.25:.2f}\n')
+
+
+def _legacy_transform(stats_dir):
+    data = {}
+
+    if os.path.exists(f'{stats_dir}/stats.csv'):
+        data = _legacy_load(f'{stats_dir}/stats.csv')
+    elif os.path.exists(f'{stats_dir}/stats.txt'):
+        data = _legacy_load(f'{stats_dir}/stats.txt')
+    elif os.path.exists(f'{stats_dir}/fmriqa_stats.csv'):
+        data.update(_legacy_tall(f'{stats_dir}/fmriqa_stats.csv'))
+    elif len(glob.glob(f'{stats_dir}/*.txt')) > 0:
+        for txt_path in glob.iglob(f'{stats_dir}/*.txt'):
+            data.update(_legacy_tall(txt_path))
+    else:
+        for csv_path in glob.iglob(f'{stats_dir}/*.csv'):
+            data.update(_legacy_wide(csv_path))
+
+    return data
+
+
+def _legacy_wide(filename):
+    data = {}
+    with open(filename, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        for line in reader:
+            for i, v in enumerate(line):
+                data[header[i]] = v
+
+    return data
+
+
+def _legacy_tall(filename):
+    data = {}
+    with open(filename) as f:
+        rows = f.readlines()
+
+    for r in rows:
+        (k, v) = r.strip().replace('=', ',').split(',')
+        data[k] = v
+
+    return data
+
+
+def _legacy_load(filename):
+    with open(filename) as f:
+        lines = f.readlines()
+
+    if ('=' in lines[0]) or (len(lines) >= 3 and len(lines[0].split(',')) <= 3):
+        return _legacy_tall(filename)
+    else:
+        return _legacy_wide(filename)
+
+
+def _bench(func, args, repeat=5):
+    # Best of repeat runs
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for a in args:
+            func(a)
+        secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+
+    return best
+
+
+def _read_dir(stats_dir):
+    files = {}
+    for name in os.listdir(stats_dir):
+        with open(f'{stats_dir}/{name}', newline='') as f:
+            files[name] = f.read()
+
+    return files
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, writer in [
+            ('FS7', _write_fs7),
+            ('fmriqa', _write_fmriqa),
+            ('Multi_Atlas', _write_multiatlas),
+        ]:
+            dirs = []
+            for i in range(count):
+                stats_dir = f'{tmpdir}/{name}_{i}'
+                os.makedirs(stats_dir)
+                writer(stats_dir)
+                dirs.append(stats_dir)
+
+            assert _legacy_transform(dirs[0]) == transform_stats(dirs[0])
+
+            old = _bench(_legacy_transform, dirs)
+            new = _bench(transform_stats, dirs)
+            print(f'{name}:{count} dirs:legacy {old:.3f}s:new {new:.3f}s:{old / new:.2f}x')
+
+            # Parsing only, files already in memory
+            texts = [_read_dir(d) for d in dirs]
+            mem = _bench(transform_stats_text, texts)
+            print(f'{name}:{count} in memory:{mem:.3f}s')
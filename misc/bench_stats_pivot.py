@@ -0,0 +1,88 @@
+"""Benchmark the stats pivot on a generated tall stats export.
+
+Compares the previous string pivot with the typed pivot used by
+Garjus.stats(), reports time and memory of the wide frame.
+
+usage: python misc/bench_stats_pivot.py [rows]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from garjus.garjus import _stats_pivot
+
+
+PROCTYPES = ['FS7_v1', 'fmriqa_v4', 'Multi_Atlas_v3', 'BrainAgeGap_v2']
+
+
+def _make_records(count):
+    # Tall rows as exported from REDCap, all values as strings
+    rng = np.random.default_rng(0)
+    names_per = 200
+    assessors = count // names_per
+
+    rows = np.arange(count)
+    assr = rows // names_per
+    proctype = np.array(PROCTYPES)[assr % len(PROCTYPES)]
+
+    df = pd.DataFrame({
+        'stats_assr': [
+            f'PROJ-x-S{a:05d}-x-S{a:05d}a-x-{p}-x-{a:08x}'
+            for a, p in zip(assr, proctype)],
+        'stats_name': [
+            f'{p.lower()}_stat{i}'
+            for p, i in zip(proctype, rows % names_per)],
+        'stats_value': [
+            f'{v:.4f}' for v in rng.random(count) * 1000],
+    })
+
+    # Some text stats too
+    df.loc[df.stats_name.str.endswith('_stat0'), 'stats_value'] = 'yes'
+
+    print(f'{len(df)} rows:{assessors} assessors')
+
+    return df
+
+
+def _legacy_pivot(df):
+    df = df[~df.stats_assr.str.contains('FS6_v1')]
+    df = df[~df.stats_name.str.startswith('fs7_')]
+    df = df.drop_duplicates(subset=['stats_assr', 'stats_name'])
+    df = pd.pivot(
+        df,
+        index='stats_assr',
+        values='stats_value',
+        columns='stats_name')
+
+    return df.reset_index()
+
+
+def _bench(func, df):
+    start = time.perf_counter()
+    wide = func(df)
+    secs = time.perf_counter() - start
+    mb = wide.memory_usage(deep=True).sum() / 1024 / 1024
+    return wide, secs, mb
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    df = _make_records(count)
+
+    old, old_secs, old_mb = _bench(_legacy_pivot, df)
+    new, new_secs, new_mb = _bench(_stats_pivot, df)
+
+    # Same assessors and stats names, values equal after parsing
+    assert sorted(old.columns) == sorted(new.columns)
+    old = old.set_index('stats_assr').sort_index()
+    new = new.set_index('stats_assr').sort_index()
+    col = 'fmriqa_v4_stat1'
+    assert np.allclose(
+        old[col].astype(float), new[col], equal_nan=True)
+
+    print(f'legacy:{old_secs:.2f}s:{old_mb:.1f}MB')
+    print(f'typed:{new_secs:.2f}s:{new_mb:.1f}MB')
+    print(f'{old_secs / new_secs:.1f}x faster:{old_mb / new_mb:.1f}x smaller')
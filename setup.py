@@ -30,6 +30,7 @@ setup(
         "dash<3.0.0",
         "flask_login",
         "pydicom",
+        "pyarrow",
     ],
     entry_points={"console_scripts": ["garjus = garjus.cli:cli"]},
     include_package_data=True,
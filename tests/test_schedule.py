@@ -0,0 +1,96 @@
+import logging
+
+import pandas as pd
+
+from garjus.tasks import garjus2dax
+from garjus.tasks.garjus2dax import _schedule
+
+
+INFLIGHT_COLS = ['LABEL', 'PROJECT', 'PROCTYPE', 'STATUS']
+
+
+def _tasks(projects):
+    # projects is dict of project to list of proctypes, one task each
+    tasks = []
+    for project, proctypes in projects.items():
+        for proctype in proctypes:
+            tasks.append({
+                'ID': str(len(tasks) + 1),
+                'PROJECT': project,
+                'ASSESSOR': f'{project}-x-SUBJ-x-SESS-x-{proctype}-x-{len(tasks)}',
+                'STATUS': 'QUEUED',
+            })
+
+    return pd.DataFrame(tasks)
+
+
+def _inflight(jobs):
+    # jobs is list of (project, proctype)
+    return pd.DataFrame([
+        {'LABEL': f'{p}-x-SUBJ-x-SESS-x-{t}-x-{i}', 'PROJECT': p, 'PROCTYPE': t, 'STATUS': 'RUNNING'}
+        for i, (p, t) in enumerate(jobs)], columns=INFLIGHT_COLS)
+
+
+def _set_limits(
+    max_inflight=500,
+    project_max=200,
+    proctype_max=200,
+    project_limits={},
+    proctype_limits={},
+    priority={},
+):
+    garjus2dax.MAX_INFLIGHT = max_inflight
+    garjus2dax.PROJECT_MAX = project_max
+    garjus2dax.PROCTYPE_MAX = proctype_max
+    garjus2dax.PROJECT_LIMITS = project_limits
+    garjus2dax.PROCTYPE_LIMITS = proctype_limits
+    garjus2dax.PROCTYPE_PRIORITY = priority
+
+
+def _projects(selected):
+    return [x['PROJECT'] for x in selected]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s:%(module)s:%(message)s',
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S')
+
+    tasks = _tasks({'A': ['FS7_v1'] * 6, 'B': ['FS7_v1'] * 2})
+
+    # Fair-share, projects take turns, fewest in flight first
+    _set_limits(max_inflight=5)
+    selected = _schedule(tasks, _inflight([('A', 'FS7_v1')]))
+    assert _projects(selected) == ['B', 'A', 'B', 'A'], _projects(selected)
+
+    # Global cap counts jobs in flight
+    _set_limits(max_inflight=3)
+    assert _schedule(tasks, _inflight([('C', 'LST_v1')] * 3)) == []
+    assert len(_schedule(tasks, _inflight([('C', 'LST_v1')] * 2))) == 1
+
+    # Per-project cap and override
+    _set_limits(project_max=2, project_limits={'B': 1})
+    selected = _schedule(tasks, _inflight([('A', 'FS7_v1')]))
+    assert sorted(_projects(selected)) == ['A', 'B'], _projects(selected)
+
+    # Per-proctype cap skips that proctype but not others
+    tasks = _tasks({'A': ['FS7_v1', 'FS7_v1', 'LST_v1'], 'B': ['FS7_v1']})
+    _set_limits(proctype_max=1, proctype_limits={'LST_v1': 5})
+    selected = _schedule(tasks, _inflight([]))
+    proctypes = sorted(x['PROCTYPE'] for x in selected)
+    assert proctypes == ['FS7_v1', 'LST_v1'], proctypes
+
+    # Higher priority first across projects, then queue order
+    tasks = _tasks({'A': ['FS7_v1', 'FS7_v1'], 'B': ['FS7_v1', 'BAG_v1']})
+    _set_limits(max_inflight=2, priority={'BAG_v1': 10})
+    selected = _schedule(tasks, _inflight([]))
+    assert selected[0]['PROCTYPE'] == 'BAG_v1'
+    assert selected[1]['ASSESSOR'] == tasks.ASSESSOR.iloc[0]
+
+    # Only queued tasks
+    tasks['STATUS'] = 'JOB_RUNNING'
+    _set_limits()
+    assert _schedule(tasks, _inflight([])) == []
+
+    logging.info('Done!')
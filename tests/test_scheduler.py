@@ -0,0 +1,129 @@
+import logging
+import os
+import tempfile
+
+from garjus.tasks.scheduler import FakeScheduler
+from garjus.tasks import dax2garjus
+from garjus.tasks.dax2garjus import _load_slurm_queue, _load_dax_queue
+
+
+JOBS = [
+    {
+        'NAME': 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-abc123.slurm',
+        'ST': 'R',
+        'STATE': 'RUNNING',
+        'JOBID': '1001',
+        'USER': 'vuiis_daily_singularity',
+    },
+    {
+        'NAME': 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-def456.slurm',
+        'ST': 'PD',
+        'STATE': 'PENDING',
+        'JOBID': '1002',
+        'USER': 'vuiis_daily_singularity',
+    },
+]
+
+FINISHED = [
+    {
+        'NAME': 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-abc123.slurm',
+        'JOBID': '1001',
+        'STATE': 'COMPLETED',
+        'USER': 'vuiis_daily_singularity',
+    },
+    {
+        'NAME': 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-ghi789.slurm',
+        'JOBID': '1000',
+        'STATE': 'TIMEOUT',
+        'USER': 'vuiis_daily_singularity',
+    },
+    {
+        'NAME': 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-jkl012.slurm',
+        'JOBID': '999',
+        'STATE': 'COMPLETED',
+        'USER': 'vuiis_daily_singularity',
+    },
+    {
+        'NAME': 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-mno345.slurm',
+        'JOBID': '998',
+        'STATE': 'FAILED',
+        'USER': 'vuiis_daily_singularity',
+    },
+    {
+        'NAME': 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-pqr678.slurm',
+        'JOBID': '997',
+        'STATE': 'COMPLETED',
+        'USER': 'vuiis_daily_singularity',
+    },
+]
+
+# procstatus in DISKQ, None if not written yet
+DISKQ = {
+    'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-abc123': 'JOB_RUNNING',
+    'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-def456': 'JOB_RUNNING',
+    'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-ghi789': None,
+    'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-jkl012': 'READY_TO_UPLOAD',
+    'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-mno345': 'JOB_FAILED',
+    'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-stu901': None,
+}
+
+
+def _write_diskq(resdir):
+    for d in ['BATCH', 'procstatus']:
+        os.makedirs(os.path.join(resdir, 'DISKQ', d))
+
+    for label, procstatus in DISKQ.items():
+        with open(os.path.join(resdir, 'DISKQ', 'BATCH', f'{label}.slurm'), 'w') as f:
+            f.write('#SBATCH --time=1-00:00:00\n')
+
+        if procstatus:
+            with open(os.path.join(resdir, 'DISKQ', 'procstatus', label), 'w') as f:
+                f.write(procstatus)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s:%(module)s:%(message)s',
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S')
+
+    df, finished = _load_slurm_queue(FakeScheduler(JOBS, FINISHED))
+
+    # Still in the queue wins over finished
+    assert len(df) == 2
+    assert 'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-abc123' not in finished.LABEL.values
+    st = dict(zip(finished.LABEL, finished.ST))
+    assert st['PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-ghi789'] == 'TO'
+
+    with tempfile.TemporaryDirectory() as resdir:
+        _write_diskq(resdir)
+        dax2garjus.RESDIR = resdir
+
+        df = _load_dax_queue(FakeScheduler(JOBS, FINISHED))
+
+    # Ended jobs do not change status written by dax, ended jobs not in
+    # diskq are not added, killed jobs with no status are failed
+    status = dict(zip(df.LABEL, df.STATUS))
+    assert status == {
+        'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-abc123': 'RUNNING',
+        'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-def456': 'PENDING',
+        'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-ghi789': 'FAILED',
+        'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-jkl012': 'COMPLETE',
+        'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-mno345': 'FAILED',
+        'PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-stu901': 'WAITING',
+    }, status
+
+    # Same status with nothing from sacct
+    with tempfile.TemporaryDirectory() as resdir:
+        _write_diskq(resdir)
+        dax2garjus.RESDIR = resdir
+
+        df = _load_dax_queue(FakeScheduler(JOBS))
+
+    status = dict(zip(df.LABEL, df.STATUS))
+    assert status['PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-jkl012'] == 'COMPLETE'
+    assert status['PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-mno345'] == 'FAILED'
+    assert status['PROJ-x-SUBJ-x-SESS-x-FS7_v1-x-ghi789'] == 'WAITING'
+
+    logging.info(df)
+    logging.info('Done!')